@@ -0,0 +1,115 @@
+"""
+Compare the memory used by normal and compact Hydrawiser objects.
+
+Usage: python benchmarks/memory.py [instances] [accounts]
+
+The objects are loaded from the test fixtures through a replay transport,
+so no network access is needed. Every account gets its own controller,
+customer and relay ids and names, so only what real accounts have in common
+can be shared. Several objects are created per account, the way an
+application tracking a fleet would.
+"""
+
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from hydrawiser.core import Hydrawiser  # noqa: E402
+from hydrawiser.replay import ReplayTransport  # noqa: E402
+
+API_URL = 'https://app.hydrawise.com/api/v1'
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures')
+
+# Fields made unique per account.
+ID_FIELDS = ('controller_id', 'customer_id', 'device_id', 'user_id',
+             'relay_id', 'id')
+NAME_FIELDS = ('name', 'serial_number', 'current_controller')
+
+
+def fixture(name):
+    """ Returns the contents of a test fixture. """
+
+    with open(os.path.join(FIXTURES, name)) as fdp:
+        return fdp.read()
+
+
+def personalize(value, account):
+    """ Returns a copy of a payload with ids and names unique to account. """
+
+    if isinstance(value, list):
+        return [personalize(item, account) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    result = {}
+    for key, item in value.items():
+        if key in ID_FIELDS and str(item).isdigit():
+            item = type(item)(int(item) + account * 1000000)
+        elif key in NAME_FIELDS and isinstance(item, str):
+            item = '{} {}'.format(item, account)
+        else:
+            item = personalize(item, account)
+        result[key] = item
+    return result
+
+
+def transport(accounts):
+    """ Returns a replay transport answering for the given accounts. """
+
+    details = json.loads(fixture('customerdetails.json'))
+    statuses = [json.loads(fixture(name)) for name in
+                ('statusschedule.json', 'iswatering.json',
+                 'donewatering.json')]
+
+    entries = []
+    for account in range(accounts):
+        key = 'key-{}'.format(account)
+        entries.append({
+            't': 0, 'd': 0, 's': 200,
+            'b': json.dumps(personalize(details, account)),
+            'u': API_URL + '/customerdetails.php?api_key=' + key})
+        for position, status in enumerate(statuses):
+            entries.append({
+                't': position, 'd': 0, 's': 200,
+                'b': json.dumps(personalize(status, account)),
+                'u': API_URL + '/statusschedule.php?api_key=' + key})
+
+    return ReplayTransport(entries, speed=0)
+
+
+def measure(instances, accounts, compact):
+    """ Returns the bytes allocated by the objects. """
+
+    with transport(accounts):
+        tracemalloc.start()
+        fleet = [Hydrawiser('key-{}'.format(i % accounts), compact=compact)
+                 for i in range(instances)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+    del fleet
+    return size
+
+
+def main():
+    """ Run the benchmark. """
+
+    instances = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    normal = measure(instances, accounts, False)
+    compact = measure(instances, accounts, True)
+
+    print('{} objects, {} accounts'.format(instances, accounts))
+    print('normal:  {:10,} bytes ({:,} per object)'.format(
+        normal, normal // instances))
+    print('compact: {:10,} bytes ({:,} per object)'.format(
+        compact, compact // instances))
+    print('reduction: {:.1f}x'.format(float(normal) / compact))
+
+
+if __name__ == '__main__':
+    main()
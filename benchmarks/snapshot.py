@@ -0,0 +1,87 @@
+"""
+Compare snapshots with serializing the raw server responses as JSON.
+
+The load column of the snapshots and pickles is the full rebuild into a
+Hydrawiser object. The raw responses can't be turned back into an object,
+so their load column is only json.loads().
+
+Usage: python benchmarks/snapshot.py [rounds]
+"""
+
+import json
+import os
+import pickle
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from hydrawiser import snapshot  # noqa: E402
+from hydrawiser.core import Hydrawiser  # noqa: E402
+from hydrawiser.replay import ReplayTransport  # noqa: E402
+
+API_URL = 'https://app.hydrawise.com/api/v1'
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures')
+
+
+def fixture(name):
+    """ Returns the contents of a test fixture. """
+
+    with open(os.path.join(FIXTURES, name)) as fdp:
+        return fdp.read()
+
+
+def main():
+    """ Run the benchmark. """
+
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    entries = [
+        {'t': 0, 'd': 0, 's': 200, 'b': fixture('customerdetails.json'),
+         'u': API_URL + '/customerdetails.php?api_key=key-0'},
+        {'t': 0, 'd': 0, 's': 200, 'b': fixture('iswatering.json'),
+         'u': API_URL + '/statusschedule.php?api_key=key-0'}]
+
+    with ReplayTransport(entries, speed=0):
+        hw = Hydrawiser('key-0')
+        compact = Hydrawiser('key-0', compact=True)
+
+    def raw_dumps():
+        return json.dumps([hw.controller_info, hw.controller_status])
+
+    def raw_loads(data=raw_dumps()):
+        return json.loads(data)
+
+    cases = [
+        ('raw json', raw_dumps, raw_loads),
+        ('snapshot json',
+         lambda: snapshot.dumps(hw, binary=False),
+         lambda data=snapshot.dumps(hw, binary=False): snapshot.loads(data)),
+        ('snapshot binary',
+         lambda: snapshot.dumps(hw),
+         lambda data=snapshot.dumps(hw): snapshot.loads(data)),
+        ('pickle',
+         lambda: pickle.dumps(hw, pickle.HIGHEST_PROTOCOL),
+         lambda data=pickle.dumps(hw, pickle.HIGHEST_PROTOCOL):
+             pickle.loads(data)),
+        ('compact encode',
+         lambda: snapshot.encode(compact.snapshot()),
+         lambda data=snapshot.dumps(compact):
+             snapshot.loads(data, compact=True)),
+        ('compact cached',
+         lambda: snapshot.dumps(compact),
+         lambda data=snapshot.dumps(compact):
+             snapshot.loads(data, compact=True))]
+
+    print('{:16} {:>8} {:>12} {:>12}'.format(
+        'format', 'bytes', 'dump (us)', 'load (us)'))
+    for name, dump, load in cases:
+        size = len(dump())
+        dump_time = timeit.timeit(dump, number=rounds) / rounds * 1e6
+        load_time = timeit.timeit(load, number=rounds) / rounds * 1e6
+        print('{:16} {:8} {:12.1f} {:12.1f}'.format(
+            name, size, dump_time, load_time))
+
+
+if __name__ == '__main__':
+    main()
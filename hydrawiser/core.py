@@ -7,69 +7,437 @@ See the README.md file for more details on the methods and
 attributes available.
 """
 
+import threading
 import time
-from hydrawiser.helpers import customer_details, status_schedule, set_zones
+from hydrawiser.helpers import (customer_details, status_schedule, set_zones,
+                                PayloadCache, Deadline, DeadlineExceeded)
+from hydrawiser.storage import (compact_info, compact_status, select_info,
+                                select_status)
+
+# Controller attributes that trigger a fetch when read in lazy mode.
+LAZY_ATTRIBUTES = frozenset((
+    'controller_info', 'controller_status', 'current_controller', 'status',
+    'controller_id', 'customer_id', 'num_relays', 'relays', 'name',
+    'sensors', 'running'))
+
+# Columns returned by Hydrawiser.zone_table().
+ZONE_TABLE_COLUMNS = ('zone', 'relay', 'relay_id', 'name', 'running',
+                      'time_remaining', 'next_run', 'suspended',
+                      'last_watered')
+
+# Version of the dictionaries returned by Hydrawiser.snapshot().
+SNAPSHOT_VERSION = 1
 
 
 class Hydrawiser():
     """
     :param user_token: User account API key
     :type user_token: string
+    :param lazy: Don't contact the server until a controller attribute is
+                 read or load() is called. Until the controller information
+                 has been fetched successfully every read tries again.
+    :type lazy: boolean
+    :param compact: Only keep the parts of the server responses the library
+                    uses and share them with other objects. The controller
+                    data must then be treated as read-only.
+    :type compact: boolean
+    :param deadline: Seconds the initial fetch may take. Every method that
+                     contacts the server accepts a deadline as well.
+    :type deadline: Deadline, float or None
+    :param stale_ok: When a deadline runs out during a refresh, keep using
+                     the controller data from the last successful refresh
+                     instead of raising DeadlineExceeded.
+    :type stale_ok: boolean
     :returns: Hydrawiser object.
     :rtype: object
     """
 
-    def __init__(self, user_token):
+    def __init__(self, user_token, lazy=False, compact=False, deadline=None,
+                 stale_ok=False):
 
         self._user_token = user_token
+        self._lazy = lazy
+        self._compact = compact
+        self._stale_ok = stale_ok
+        # _load_lock serializes lazy loading, _update_cond refreshes and _lock
+        # guards the controller attributes while they are replaced. They are
+        # always taken in that order. Refreshes wait on a condition rather
+        # than a lock because Lock.acquire() has no timeout on Python 2.
+        self._load_lock = threading.Lock()
+        self._update_cond = threading.Condition(threading.Lock())
+        self._updating = False
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._load_ok = False
+
+        # Responses are fingerprinted so that unchanged ones are skipped.
+        self._info_cache = PayloadCache()
+        self._status_cache = PayloadCache()
+        self._current = False
+        self._polls = 0
+        self._skipped = 0
+
+        if lazy:
+            # Nothing is fetched until one of the controller attributes is
+            # read, or load() is called.
+            return
 
         # Attributes that we will be tracking from the controller.
-        self.controller_info = []
-        self.controller_status = []
-        self.current_controller = []
-        self.status = None
-        self.controller_id = None
-        self.customer_id = None
-        self.num_relays = None
-        self.relays = []
-        self.status = None
-        self.name = None
-        self.sensors = []
-        self.running = None
-
-        self.update_controller_info()
-
-    def update_controller_info(self):
+        self.__dict__.update(self._default_attributes())
+
+        self.load(deadline)
+
+    @staticmethod
+    def _default_attributes():
+        """
+        Returns the controller attributes before anything has been fetched.
+
+        :returns: Attribute names and their default values.
+        :rtype: dict
+        """
+
+        return {
+            'controller_info': [],
+            'controller_status': [],
+            'current_controller': [],
+            'status': None,
+            'controller_id': None,
+            'customer_id': None,
+            'num_relays': None,
+            'relays': [],
+            'name': None,
+            'sensors': [],
+            'running': None}
+
+    def __getattr__(self, name):
+        """
+        Fetch the controller information on first access in lazy mode.
+
+        Only called when normal attribute lookup fails, so once the controller
+        attributes exist this adds no overhead.
+        """
+
+        if name in LAZY_ATTRIBUTES:
+            self.load()
+            # The attributes are only missing if the fetch failed.
+            return self.__dict__.get(name, self._default_attributes()[name])
+
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+            self.__class__.__name__, name))
+
+    def load(self, deadline=None):
+        """
+        Fetch the controller information if it hasn't been fetched
+        successfully yet.
+
+        :param deadline: Seconds the fetch may take.
+        :type deadline: Deadline, float or None
+        :returns: True if the controller information was fetched successfully,
+                  otherwise False.
+        :rtype: boolean
+        """
+
+        with self._load_lock:
+            if not self._loaded:
+                try:
+                    self._load_ok = self.update_controller_info(deadline)
+                finally:
+                    if not self._loaded:
+                        self._unload()
+
+        return self._load_ok
+
+    def _fill_defaults(self):
+        """ Set the controller attributes a failed fetch left unset. """
+
+        for key, value in self._default_attributes().items():
+            self.__dict__.setdefault(key, value)
+
+    def _unload(self):
+        """
+        Reset the controller attributes after a failed load() so that it can
+        be retried. A lazy object tries again on the next attribute read.
+        """
+
+        with self._lock:
+            if self._lazy:
+                for key in LAZY_ATTRIBUTES:
+                    self.__dict__.pop(key, None)
+            else:
+                self._fill_defaults()
+
+    def _read(self, names, deadline=None, load=True):
+        """
+        Returns controller attributes from the same refresh.
+
+        A lazy object is loaded first, outside of _lock, so that reading
+        attributes a failed load removed doesn't take the locks out of order.
+
+        :param names: The attribute names.
+        :type names: tuple
+        :param deadline: Time budget for loading a lazy object.
+        :type deadline: Deadline or None
+        :param load: Load a lazy object. Callers that just refreshed the
+                     object pass False so that a failed refresh isn't sent
+                     again.
+        :type load: boolean
+        :returns: The values, None for attributes that aren't set.
+        :rtype: tuple
+        """
+
+        if load and self._lazy and not self._loaded:
+            self.load(deadline)
+
+        with self._lock:
+            return tuple(self.__dict__.get(name) for name in names)
+
+    def snapshot(self):
+        """
+        Returns the controller data needed to rebuild this object without
+        contacting the server. Only the fields the library uses are kept.
+        The API key is not included.
+
+        :returns: The snapshot. It only contains JSON serializable data and
+                  shares that data with the object, so it must be treated as
+                  read-only.
+        :rtype: dict
+        """
+
+        controller_info, controller_status = self._read(
+            ('controller_info', 'controller_status'))
+        controller_info = controller_info or None
+        controller_status = controller_status or None
+
+        if not self._compact:
+            # Select the fields without the interning and sharing done for
+            # compact objects, which costs more than it saves here.
+            controller_info = select_info(controller_info)
+            controller_status = select_status(controller_status)
+
+        return {'version': SNAPSHOT_VERSION,
+                'controller_info': controller_info,
+                'controller_status': controller_status}
+
+    @classmethod
+    def from_snapshot(cls, snapshot, user_token=None, compact=False):
+        """
+        Create a Hydrawiser object from a snapshot without contacting the
+        server.
+
+        :param snapshot: A snapshot returned by snapshot().
+        :type snapshot: dict
+        :param user_token: User account API key. Needed to send commands or
+                           refresh the object.
+        :type user_token: string or None
+        :param compact: See the compact argument of Hydrawiser.
+        :type compact: boolean
+        :returns: Hydrawiser object.
+        :rtype: object
+        :raises ValueError: The snapshot version isn't supported.
+        """
+
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Unsupported snapshot version {}.'.format(
+                snapshot.get('version')))
+
+        hydrawiser = cls(user_token, lazy=True, compact=compact)
+        with hydrawiser._lock:
+            hydrawiser._loaded = True
+            try:
+                hydrawiser._load_ok = hydrawiser._apply(
+                    snapshot['controller_info'],
+                    snapshot['controller_status'])
+            finally:
+                hydrawiser._fill_defaults()
+
+        return hydrawiser
+
+    def __reduce__(self):
+        """
+        Pickle the object as its snapshot so unpickling doesn't contact the
+        server.
+
+        Unlike snapshot() and snapshot.dumps(), the pickle includes the API
+        key so that the copy can refresh and send commands. Use
+        snapshot.dumps() to store controller data without it.
+        """
+
+        if not self._loaded:
+            return (self.__class__, (self._user_token, True, self._compact))
+
+        return (self.__class__.from_snapshot,
+                (self.snapshot(), self._user_token, self._compact))
+
+    @property
+    def loaded(self):
+        """
+        True once the controller information has been fetched
+        successfully, or restored from a snapshot.
+
+        :rtype: boolean
+        """
+
+        return self._loaded
+
+    def update_controller_info(self, deadline=None):
         """
         Pulls controller information.
 
+        :param deadline: Seconds the update may take.
+        :type deadline: Deadline, float or None
         :returns: True if successfull, otherwise False.
         :rtype: boolean
+        :raises DeadlineExceeded: The deadline ran out and stale_ok is False
+                                  or there is no earlier data to fall back
+                                  on.
         """
 
-        # Read the controller information.
-        self.controller_info = customer_details(self._user_token)
-        self.controller_status = status_schedule(self._user_token)
+        deadline = Deadline.coerce(deadline)
+
+        # Refreshes of the same object run one at a time, so that the payload
+        # caches describe the data that was applied.
+        with self._update_cond:
+            while self._updating:
+                remaining = None if deadline is None else deadline.remaining()
+                if remaining is not None and remaining <= 0:
+                    if self._stale_ok and self._current:
+                        return False
+                    raise DeadlineExceeded(
+                        'Deadline of {}s exceeded waiting for another update.'
+                        .format(deadline.budget))
+                self._update_cond.wait(remaining)
+            self._updating = True
+
+        try:
+            return self._update(deadline)
+        finally:
+            with self._update_cond:
+                self._updating = False
+                self._update_cond.notify()
+
+    def _update(self, deadline):
+        """
+        Fetch and apply the controller information. Called with the update
+        lock held.
 
-        if self.controller_info is None or self.controller_status is None:
-            return False
+        :param deadline: Time budget for the requests.
+        :type deadline: Deadline or None
+        :returns: True if successfull, otherwise False.
+        :rtype: boolean
+        """
 
-        # Only supports one controller right now.
-        # Use the first one from the array.
-        self.current_controller = self.controller_info['controllers'][0]
-        self.status = self.current_controller['status']
-        self.controller_id = self.current_controller['controller_id']
-        self.customer_id = self.controller_info['customer_id']
-        self.num_relays = len(self.controller_status['relays'])
-        self.relays = self.controller_status['relays']
-        self.name = self.controller_info['controllers'][0]['name']
-        self.sensors = self.controller_status['sensors']
         try:
-            self.running = self.controller_status['running']
-        except KeyError:
-            self.running = None
+            # Read the controller information.
+            controller_info = customer_details(self._user_token,
+                                               cache=self._info_cache,
+                                               deadline=deadline)
+            controller_status = status_schedule(self._user_token,
+                                                cache=self._status_cache,
+                                                deadline=deadline)
+
+            self._polls += 1
+
+            # Nothing changed since the last successful update.
+            if self._current and controller_info is not None and \
+               controller_status is not None and \
+               not self._info_cache.changed and \
+               not self._status_cache.changed:
+                self._skipped += 1
+                return True
+
+            if self._apply(controller_info, controller_status):
+                return True
+        except DeadlineExceeded:
+            self._reset_caches()
+            if self._stale_ok and self._current:
+                # Keep the data from the last successful update.
+                return False
+            raise
+        except Exception:
+            self._reset_caches()
+            raise
+
+        self._reset_caches()
+        return False
+
+    def _reset_caches(self):
+        """
+        Forget the remembered responses after an update that wasn't
+        applied. A response that did arrive has already been remembered,
+        and the next update must not skip it as unchanged.
+        """
 
-        return True
+        self._info_cache.reset()
+        self._status_cache.reset()
+
+    def _apply(self, controller_info, controller_status):
+        """
+        Set the controller attributes from the server responses.
+
+        :param controller_info: The customerdetails.php response.
+        :type controller_info: dict or None
+        :param controller_status: The statusschedule.php response.
+        :type controller_status: dict or None
+        :returns: True if successfull, otherwise False.
+        :rtype: boolean
+        """
+
+        if self._compact:
+            controller_info = compact_info(controller_info)
+            controller_status = compact_status(controller_status)
+
+            # Keep the compacted responses in the caches instead of the raw
+            # ones so that each is only held once.
+            if controller_info is not None:
+                self._info_cache.payload = controller_info
+            if controller_status is not None:
+                self._status_cache.payload = controller_status
+
+        # Readers holding the lock, such as zone_table() and snapshot(),
+        # never see a mix of old and new attributes.
+        with self._lock:
+            self._current = False
+            self.controller_info = controller_info
+            self.controller_status = controller_status
+
+            if controller_info is None or controller_status is None:
+                return False
+
+            # Only supports one controller right now.
+            # Use the first one from the array.
+            self.current_controller = controller_info['controllers'][0]
+            self.status = self.current_controller['status']
+            self.controller_id = self.current_controller['controller_id']
+            self.customer_id = controller_info['customer_id']
+            self.num_relays = len(controller_status['relays'])
+            self.relays = controller_status['relays']
+            self.name = controller_info['controllers'][0]['name']
+            self.sensors = controller_status['sensors']
+            try:
+                self.running = controller_status['running']
+            except KeyError:
+                self.running = None
+
+            self._current = True
+            self._loaded = True
+            self._load_ok = True
+            return True
+
+    def poll_stats(self):
+        """
+        Returns how often updates were skipped because nothing changed.
+
+        :returns: polls is the number of calls to update_controller_info(),
+                  skipped how many of those found both responses unchanged,
+                  responses and unchanged the same for individual responses.
+        :rtype: dict
+        """
+
+        caches = (self._info_cache, self._status_cache)
+        return {'polls': self._polls,
+                'skipped': self._skipped,
+                'responses': sum(cache.responses for cache in caches),
+                'unchanged': sum(cache.unchanged for cache in caches)}
 
     def controller(self):
         """
@@ -94,10 +462,11 @@ class Hydrawiser():
         :rtype: string
         """
 
+        # Don't trigger a fetch from a lazy object.
         return "<{0}: {1}>".format(self.__class__.__name__,
-                                   self.controller_id)
+                                   self.__dict__.get('controller_id'))
 
-    def relay_info(self, relay, attribute=None):
+    def relay_info(self, relay, attribute=None, deadline=None):
         """
         Return information about a relay.
 
@@ -106,26 +475,30 @@ class Hydrawiser():
         :param attribute: The attribute being queried, or all attributes for
                           that relay if None is specified.
         :type attribute: string or None
+        :param deadline: Seconds loading a lazy object may take.
+        :type deadline: Deadline, float or None
         :returns: The attribute being queried or None if not found.
         :rtype: string or int
         """
 
+        relays = self._read(('relays',), Deadline.coerce(deadline))[0] or []
+
         # Check if the relay number is valid.
-        if (relay < 0) or (relay > (self.num_relays - 1)):
+        if (relay < 0) or (relay > (len(relays) - 1)):
             # Invalid relay index specified.
             return None
         else:
             if attribute is None:
                 # Return all the relay attributes.
-                return self.relays[relay]
+                return relays[relay]
             else:
                 try:
-                    return self.relays[relay][attribute]
+                    return relays[relay][attribute]
                 except KeyError:
                     # Invalid key specified.
                     return None
 
-    def suspend_zone(self, days, zone=None):
+    def suspend_zone(self, days, zone=None, deadline=None):
         """
         Suspend or unsuspend a zone or all zones for an amount of time.
 
@@ -134,18 +507,25 @@ class Hydrawiser():
         :param zone: The zone to suspend. If no zone is specified then suspend
                      all zones
         :type zone: int or None
+        :param deadline: Seconds the command may take.
+        :type deadline: Deadline, float or None
         :returns: The response from set_zones() or None if there was an error.
         :rtype: None or string
         """
+
+        # Loading a lazy object and the command share the deadline.
+        deadline = Deadline.coerce(deadline)
+
         if zone is None:
             zone_cmd = 'suspendall'
             relay_id = None
         else:
-            if zone < 0 or zone > (len(self.relays) - 1):
+            relays = self._read(('relays',), deadline)[0] or []
+            if zone < 0 or zone > (len(relays) - 1):
                 return None
             else:
                 zone_cmd = 'suspend'
-                relay_id = self.relays[zone]['relay_id']
+                relay_id = relays[zone]['relay_id']
 
         # If days is 0 then remove suspension
         if days <= 0:
@@ -154,9 +534,10 @@ class Hydrawiser():
             # 1 day = 60 * 60 * 24 seconds = 86400
             time_cmd = time.mktime(time.localtime()) + (days * 86400)
 
-        return set_zones(self._user_token, zone_cmd, relay_id, time_cmd)
+        return set_zones(self._user_token, zone_cmd, relay_id, time_cmd,
+                         deadline=deadline)
 
-    def run_zone(self, minutes, zone=None):
+    def run_zone(self, minutes, zone=None, deadline=None):
         """
         Run or stop a zone or all zones for an amount of time.
 
@@ -165,18 +546,25 @@ class Hydrawiser():
         :param zone: The zone number to run. If no zone is specified then run
                      all zones.
         :type zone: int or None
+        :param deadline: Seconds the command may take.
+        :type deadline: Deadline, float or None
         :returns: The response from set_zones() or None if there was an error.
         :rtype: None or string
         """
+
+        # Loading a lazy object and the command share the deadline.
+        deadline = Deadline.coerce(deadline)
+
         if zone is None:
             zone_cmd = 'runall'
             relay_id = None
         else:
-            if zone < 0 or zone > (len(self.relays) - 1):
+            relays = self._read(('relays',), deadline)[0] or []
+            if zone < 0 or zone > (len(relays) - 1):
                 return None
             else:
                 zone_cmd = 'run'
-                relay_id = self.relays[zone]['relay_id']
+                relay_id = relays[zone]['relay_id']
 
         if minutes <= 0:
             time_cmd = 0
@@ -187,62 +575,195 @@ class Hydrawiser():
         else:
             time_cmd = minutes * 60
 
-        return set_zones(self._user_token, zone_cmd, relay_id, time_cmd)
+        return set_zones(self._user_token, zone_cmd, relay_id, time_cmd,
+                         deadline=deadline)
 
-    def list_running_zones(self):
+    def list_running_zones(self, deadline=None):
         """
         Returns the currently active relay.
 
+        Like is_zone_running() and time_remaining() this uses the relay
+        number reported by the controller. Only the first running relay is
+        returned, running_relays() returns all of them.
+
+        :param deadline: Seconds the call may take.
+        :type deadline: Deadline, float or None
         :returns: Returns the running relay number or None if no relays are
                   active.
-        :rtype: string
+        :rtype: int or None
         """
 
-        self.update_controller_info()
+        self.update_controller_info(deadline)
 
-        if self.running is None or not self.running:
+        running = self._read(('running',), load=False)[0]
+        if not running:
             return None
-        return int(self.running[0]['relay'])
+        return int(running[0]['relay'])
 
-    def is_zone_running(self, zone):
+    def is_zone_running(self, zone, deadline=None):
         """
         Returns the state of the specified zone.
 
         :param zone: The zone to check.
         :type zone: int
+        :param deadline: Seconds the call may take.
+        :type deadline: Deadline, float or None
         :returns: Returns True if the zone is currently running, otherwise
                   returns False if the zone is not running.
         :rtype: boolean
         """
 
-        self.update_controller_info()
-
-        if self.running is None or not self.running:
-            return False
+        self.update_controller_info(deadline)
 
-        if int(self.running[0]['relay']) == zone:
-            return True
-
-        return False
+        running = self._read(('running',), load=False)[0]
+        return self._running_entry(zone, running) is not None
 
-    def time_remaining(self, zone):
+    def time_remaining(self, zone, deadline=None):
         """
         Returns the amount of watering time left in seconds.
 
         :param zone: The zone to check.
         :type zone: int
+        :param deadline: Seconds the call may take.
+        :type deadline: Deadline, float or None
         :returns: If the zone is not running returns 0. If the zone doesn't
                   exist returns None. Otherwise returns number of seconds left
                   in the watering cycle.
         :rtype: None or seconds left in the waterting cycle.
         """
 
-        self.update_controller_info()
+        self.update_controller_info(deadline)
 
-        if zone < 0 or zone > (self.num_relays-1):
+        # Answer from a single refresh, even if another thread refreshes the
+        # object meanwhile.
+        relays, running = self._read(('relays', 'running'), load=False)
+        if zone < 0 or zone > (len(relays or []) - 1):
             return None
 
-        if self.is_zone_running(zone):
-            return int(self.running[0]['time_left'])
+        entry = self._running_entry(zone, running)
+        if entry is None:
+            return 0
+        return int(entry['time_left'])
+
+    @staticmethod
+    def _running_entry(zone, running):
+        """
+        Returns the entry of the running list for a zone.
+
+        Zones are matched against the relay number reported in the running
+        list, as is_zone_running() always has. Every entry is checked because
+        more than one zone can run at the same time.
+
+        :param zone: The zone to look for.
+        :type zone: int
+        :param running: The running list to search.
+        :type running: list or None
+        :returns: The running entry or None if the zone is not running.
+        :rtype: dict or None
+        """
+
+        for entry in running or []:
+            if int(entry['relay']) == zone:
+                return entry
+        return None
+
+    def zone_table(self, refresh=True, deadline=None):
+        """
+        Returns the state of every zone from a single refresh.
+
+        The result has one column per attribute and one row per zone, in the
+        same order as relays, so it can be passed straight to numpy or a
+        dataframe. Running zones are matched on relay_id, so every zone that
+        is running is reported.
+
+        The zone column is the index into relays, the zone number taken by
+        run_zone(), suspend_zone() and relay_info(). The relay column is the
+        relay number used by is_zone_running(), time_remaining(),
+        list_running_zones() and running_relays().
+
+        :param refresh: Fetch the controller information first.
+        :type refresh: boolean
+        :param deadline: Seconds the refresh, or loading a lazy object, may
+                         take.
+        :type deadline: Deadline, float or None
+        :returns: The columns zone (index into relays), relay (relay
+                  number), relay_id, name, running,
+                  time_remaining (seconds), next_run (seconds until the next
+                  scheduled run), suspended (unix time the suspension ends,
+                  or None) and last_watered.
+        :rtype: dict
+        """
+
+        deadline = Deadline.coerce(deadline)
+        if refresh:
+            self.update_controller_info(deadline)
+
+        relays, running = self._read(('relays', 'running'), deadline,
+                                     load=not refresh)
+        relays = relays or []
+        running = running or []
+
+        time_left = dict((str(entry['relay_id']), int(entry['time_left']))
+                         for entry in running)
+
+        table = dict((column, []) for column in ZONE_TABLE_COLUMNS)
+        for zone, relay in enumerate(relays):
+            remaining = time_left.get(str(relay['relay_id']))
+            try:
+                suspended = int(relay.get('suspended'))
+            except (TypeError, ValueError):
+                suspended = None
+
+            table['zone'].append(zone)
+            table['relay'].append(relay.get('relay'))
+            table['relay_id'].append(relay['relay_id'])
+            table['name'].append(relay.get('name'))
+            table['running'].append(remaining is not None)
+            table['time_remaining'].append(remaining or 0)
+            table['next_run'].append(relay.get('time'))
+            table['suspended'].append(suspended)
+            table['last_watered'].append(relay.get('lastwater'))
+
+        return table
+
+    def running_zones(self, refresh=True, deadline=None):
+        """
+        Returns every zone that is running.
+
+        Zones are indexes into relays, as taken by run_zone(),
+        suspend_zone() and relay_info(). running_relays() returns the same
+        zones as relay numbers.
+
+        :param refresh: Fetch the controller information first.
+        :type refresh: boolean
+        :param deadline: Seconds the refresh, or loading a lazy object, may
+                         take.
+        :type deadline: Deadline, float or None
+        :returns: The indexes into relays of the running zones.
+        :rtype: set
+        """
+
+        table = self.zone_table(refresh, deadline)
+        return set(zone for zone, running in
+                   zip(table['zone'], table['running']) if running)
+
+    def running_relays(self, refresh=True, deadline=None):
+        """
+        Returns the relay number of every zone that is running.
+
+        Relay numbers are the zones taken by is_zone_running() and
+        time_remaining(). running_zones() returns the same zones as indexes
+        into relays.
+
+        :param refresh: Fetch the controller information first.
+        :type refresh: boolean
+        :param deadline: Seconds the refresh, or loading a lazy object, may
+                         take.
+        :type deadline: Deadline, float or None
+        :returns: The relay numbers of the running zones.
+        :rtype: set
+        """
 
-        return 0
+        table = self.zone_table(refresh, deadline)
+        return set(int(relay) for relay, running in
+                   zip(table['relay'], table['running']) if running)
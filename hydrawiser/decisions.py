@@ -0,0 +1,280 @@
+"""
+Decide locally whether zones should be skipped.
+
+The statusschedule.php response already contains everything needed to tell
+whether watering makes sense right now: the sensors and the relays they
+control, the rain forecast, the rain observed and the suspension time of
+each relay. SkipAdvisor parses that data once per snapshot and answers
+questions about it without contacting the server::
+
+    advisor = SkipAdvisor(hw)
+    advisor.should_skip(2)
+    True
+    advisor.reasons(2)
+    ['sensor', 'forecast']
+
+The parsed snapshot is reused until update_controller_info() replaces the
+controller status, so asking about every zone costs a single parse.
+"""
+
+import re
+import time
+
+# Skip when today's probability of precipitation is at least this (percent).
+DEFAULT_RAIN_PROBABILITY = 70
+
+# Skip when the observed rainfall is at least this many inches.
+DEFAULT_RAIN_AMOUNT = 0.25
+
+# Reasons reported by SkipAdvisor, in the order they are checked.
+REASONS = ('sensor', 'forecast', 'rain', 'suspended')
+
+AMOUNT_RE = re.compile(r'^\s*([0-9]*\.?[0-9]+)\s*(in|mm)?\s*$')
+
+
+def parse_amount(text):
+    """
+    Convert a rainfall string from the server into inches.
+
+    :param text: The rainfall, for example '0.1 in' or '3 mm'.
+    :type text: string
+    :returns: The rainfall in inches or None if it isn't known.
+    :rtype: float or None
+    """
+
+    match = AMOUNT_RE.match(text or '')
+    if match is None:
+        return None
+
+    amount = float(match.group(1))
+    if match.group(2) == 'mm':
+        amount = amount / 25.4
+    return amount
+
+
+def _to_int(value):
+    """ Convert a number that may be sent as a string, None if invalid. """
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Snapshot():
+    """
+    The parts of a controller status used to make decisions, indexed by
+    relay.
+
+    :param status: The statusschedule.php response.
+    :type status: dict
+    """
+
+    def __init__(self, status):
+
+        relays = status.get('relays') or []
+
+        self.relay_ids = [relay.get('relay_id') for relay in relays]
+        self.suspended = [_to_int(relay.get('suspended')) for relay in relays]
+
+        index = {}
+        for position, relay in enumerate(relays):
+            index[str(relay.get('relay_id'))] = position
+
+        # Names of the active sensors controlling each relay.
+        self.sensors = [[] for _ in relays]
+        for sensor in status.get('sensors') or []:
+            if not _to_int(sensor.get('active')):
+                continue
+            for relay in sensor.get('relays') or []:
+                position = index.get(str(relay.get('id')))
+                if position is not None:
+                    self.sensors[position].append(sensor.get('name'))
+
+        forecast = status.get('forecast') or []
+        if forecast:
+            self.pop = _to_int(forecast[0].get('pop'))
+            self.conditions = forecast[0].get('conditions')
+        else:
+            self.pop = None
+            self.conditions = None
+
+        self.obs_rain = parse_amount(status.get('obs_rain'))
+
+
+class SkipAdvisor():
+    """
+    Answers whether zones of a controller should be skipped.
+
+    A zone is skipped when any of these are true:
+
+    * sensor - an active sensor controls the zone.
+    * forecast - today's probability of rain is at least rain_probability.
+    * rain - the observed rainfall is at least rain_amount inches.
+    * suspended - the zone is suspended.
+
+    :param hydrawiser: The controller to advise on.
+    :type hydrawiser: Hydrawiser
+    :param rain_probability: Forecast threshold in percent.
+    :type rain_probability: int
+    :param rain_amount: Observed rainfall threshold in inches.
+    :type rain_amount: float
+    """
+
+    def __init__(self, hydrawiser,
+                 rain_probability=DEFAULT_RAIN_PROBABILITY,
+                 rain_amount=DEFAULT_RAIN_AMOUNT):
+
+        self.hydrawiser = hydrawiser
+        self.rain_probability = rain_probability
+        self.rain_amount = rain_amount
+
+        self._status = None
+        self._snapshot = None
+        self._flags = None
+
+    def _current(self):
+        """
+        Returns the parsed snapshot and the reasons that don't depend on the
+        time, parsing the controller status again only if it was replaced.
+        """
+
+        status = self.hydrawiser.controller_status
+        if status is not self._status or self._snapshot is None:
+            snapshot = _Snapshot(status or {})
+
+            forecast = snapshot.pop is not None and \
+                snapshot.pop >= self.rain_probability
+            rain = snapshot.obs_rain is not None and \
+                snapshot.obs_rain >= self.rain_amount
+
+            self._flags = [(bool(names), forecast, rain)
+                           for names in snapshot.sensors]
+            self._snapshot = snapshot
+            self._status = status
+
+        return self._snapshot, self._flags
+
+    def evaluate(self, now=None):
+        """
+        Evaluate every zone of the controller.
+
+        :param now: Unix time to evaluate suspensions at. Defaults to now.
+        :type now: float or None
+        :returns: Columns with one entry per zone: zone, relay_id, sensor,
+                  forecast, rain, suspended and skip.
+        :rtype: dict
+        """
+
+        if now is None:
+            now = time.time()
+
+        snapshot, flags = self._current()
+
+        result = {'zone': list(range(len(flags))),
+                  'relay_id': list(snapshot.relay_ids),
+                  'sensor': [], 'forecast': [], 'rain': [],
+                  'suspended': [], 'skip': []}
+
+        for (sensor, forecast, rain), until in zip(flags,
+                                                   snapshot.suspended):
+            suspended = until is not None and until > now
+            result['sensor'].append(sensor)
+            result['forecast'].append(forecast)
+            result['rain'].append(rain)
+            result['suspended'].append(suspended)
+            result['skip'].append(sensor or forecast or rain or suspended)
+
+        return result
+
+    def reasons(self, zone, now=None):
+        """
+        Returns why a zone should be skipped.
+
+        :param zone: The zone to check.
+        :type zone: int
+        :param now: Unix time to evaluate suspensions at. Defaults to now.
+        :type now: float or None
+        :returns: The reasons, empty if the zone should run, or None if the
+                  zone doesn't exist.
+        :rtype: list or None
+        """
+
+        snapshot, flags = self._current()
+
+        if zone < 0 or zone > (len(flags) - 1):
+            return None
+
+        if now is None:
+            now = time.time()
+
+        until = snapshot.suspended[zone]
+        checks = flags[zone] + (until is not None and until > now,)
+        return [reason for reason, hit in zip(REASONS, checks) if hit]
+
+    def should_skip(self, zone, now=None):
+        """
+        Returns whether a zone should be skipped.
+
+        :param zone: The zone to check.
+        :type zone: int
+        :param now: Unix time to evaluate suspensions at. Defaults to now.
+        :type now: float or None
+        :returns: True if the zone should be skipped, False if it should run
+                  or None if the zone doesn't exist.
+        :rtype: boolean or None
+        """
+
+        reasons = self.reasons(zone, now)
+        if reasons is None:
+            return None
+        return bool(reasons)
+
+    def sensor_names(self, zone):
+        """
+        Returns the names of the active sensors controlling a zone.
+
+        :param zone: The zone to check.
+        :type zone: int
+        :returns: The sensor names or None if the zone doesn't exist.
+        :rtype: list or None
+        """
+
+        snapshot = self._current()[0]
+
+        if zone < 0 or zone > (len(snapshot.sensors) - 1):
+            return None
+        return list(snapshot.sensors[zone])
+
+
+def evaluate_fleet(advisors, now=None):
+    """
+    Evaluate every zone of many controllers at once.
+
+    The columns of each SkipAdvisor.evaluate() are concatenated and a
+    controller_id column is added, so the result can be handed straight to
+    numpy or a dataframe.
+
+    :param advisors: The advisors to evaluate.
+    :type advisors: iterable of SkipAdvisor
+    :param now: Unix time to evaluate suspensions at. Defaults to now.
+    :type now: float or None
+    :returns: Columns with one entry per zone of every controller.
+    :rtype: dict
+    """
+
+    if now is None:
+        now = time.time()
+
+    result = {'controller_id': [], 'zone': [], 'relay_id': []}
+    for reason in REASONS + ('skip',):
+        result[reason] = []
+
+    for advisor in advisors:
+        columns = advisor.evaluate(now)
+        result['controller_id'].extend(
+            [advisor.hydrawiser.controller_id] * len(columns['zone']))
+        for key, values in columns.items():
+            result[key].extend(values)
+
+    return result
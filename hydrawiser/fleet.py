@@ -0,0 +1,319 @@
+"""
+Operations on many Hydrawiser objects at once.
+
+The Hydrawiser object talks to the server with blocking requests. The
+functions in this module spread that work over a pool of threads so that
+the time taken doesn't grow with the number of accounts.
+"""
+
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from hydrawiser.core import ZONE_TABLE_COLUMNS
+from hydrawiser.helpers import last_error
+
+DEFAULT_WORKERS = 16
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+
+# Outcome of a command for one account in a bulk_command() manifest.
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+STATE_INVALID = 'invalid'
+
+
+def prefetch(instances, max_workers=DEFAULT_WORKERS):
+    """
+    Fetch the controller information for many objects concurrently.
+
+    Objects created with lazy=True are loaded and objects whose earlier
+    fetch failed are tried again. Objects that are already loaded are left
+    alone.
+
+    :param instances: The Hydrawiser objects to load.
+    :type instances: iterable
+    :param max_workers: The maximum number of concurrent requests.
+    :type max_workers: int
+    :returns: The result of load() for each object, in the same order.
+    :rtype: list
+    """
+
+    instances = list(instances)
+    if not instances:
+        return []
+
+    workers = max(1, min(max_workers, len(instances)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda hw: hw.load(), instances))
+
+
+def account_key(hydrawiser):
+    """
+    Returns a stable identifier for the account of a Hydrawiser object that
+    doesn't reveal its API key.
+
+    :param hydrawiser: The object to identify.
+    :type hydrawiser: Hydrawiser
+    :returns: A short hex digest of the API key.
+    :rtype: string
+    """
+
+    token = hydrawiser._user_token  # pylint: disable=protected-access
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:16]
+
+
+class RetryableError(Exception):
+    """ A command failed in a way that may succeed if it is sent again. """
+
+
+class RejectedError(Exception):
+    """
+    The server answered a command with an error message, such as for an
+    invalid API key. Sending it again won't help.
+    """
+
+
+def _failure(message):
+    """
+    Returns the error for a request that got no usable response.
+
+    :param message: The message used if the server didn't send one.
+    :type message: string
+    :rtype: RetryableError or RejectedError
+    """
+
+    error = last_error()
+    if error is not None:
+        return RejectedError(error)
+    return RetryableError(message)
+
+
+def _send(hydrawiser, method, value, zone):
+    """
+    Send a single command.
+
+    The controller information is only needed to check the zone, so it
+    isn't fetched for commands on all zones.
+
+    :returns: (state, response) where state is done or invalid.
+    :rtype: tuple
+    :raises RetryableError: The command should be sent again.
+    :raises RejectedError: The server refused the command.
+    """
+
+    try:
+        if zone is not None:
+            # Read the attributes directly, a lazy object would fetch them
+            # without a way to tell the caller why that failed.
+            if not hydrawiser.__dict__.get('relays') and \
+               not hydrawiser.update_controller_info():
+                raise _failure('Unable to read the controller information.')
+
+            relays = hydrawiser.__dict__.get('relays') or []
+            if zone < 0 or zone > (len(relays) - 1):
+                return STATE_INVALID, None
+
+        response = getattr(hydrawiser, method)(value, zone)
+    except requests.exceptions.RequestException as error:
+        raise RetryableError(str(error))
+
+    if response is None:
+        raise _failure('The server rejected the command.')
+
+    return STATE_DONE, response
+
+
+def bulk_command(instances, method, value, zone=None,
+                 max_workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, progress=None, manifest=None):
+    """
+    Send the same run_zone() or suspend_zone() command to many accounts.
+
+    Commands are sent concurrently. Failures caused by the network or the
+    server are retried with exponential backoff, commands the server
+    refuses with an error message are not. The returned manifest
+    records the outcome for each account and is plain JSON data, so it can
+    be saved and passed back in later; accounts that are already done are
+    skipped, which makes it safe to run the same command again until every
+    account has succeeded. Each result holds the state, the number of
+    attempts, the controller_id, None if it was never fetched, and the
+    message from the server or the last error.
+
+    :param instances: The Hydrawiser objects to command.
+    :type instances: iterable
+    :param method: 'run_zone' or 'suspend_zone'.
+    :type method: string
+    :param value: The minutes or days passed to the method.
+    :type value: int
+    :param zone: The zone passed to the method, None for all zones.
+    :type zone: int or None
+    :param max_workers: The maximum number of concurrent requests.
+    :type max_workers: int
+    :param retries: The number of times a failed command is sent again.
+    :type retries: int
+    :param backoff: Seconds to wait before the first retry. The wait doubles
+                    with each retry.
+    :type backoff: float
+    :param progress: Called as progress(completed, total, key, result) after
+                     each account finishes.
+    :type progress: callable or None
+    :param manifest: A manifest from a previous run of the same command.
+    :type manifest: dict or None
+    :returns: The manifest.
+    :rtype: dict
+    :raises ValueError: The manifest is for a different command.
+    """
+
+    if method not in ('run_zone', 'suspend_zone'):
+        raise ValueError('Unsupported method {}.'.format(method))
+
+    command = {'method': method, 'value': value, 'zone': zone}
+
+    if manifest is None:
+        manifest = dict(command, results={})
+    elif any(manifest.get(name) != setting
+             for name, setting in command.items()):
+        raise ValueError('The manifest is for a different command.')
+
+    results = manifest['results']
+    pending = [(account_key(hw), hw) for hw in instances]
+    pending = [(key, hw) for key, hw in pending
+               if results.get(key, {}).get('state') != STATE_DONE]
+
+    lock = threading.Lock()
+    counter = {'completed': 0}
+
+    def work(item):
+        key, hydrawiser = item
+        result = {'state': STATE_FAILED, 'attempts': 0,
+                  'controller_id': None, 'message': None}
+
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(backoff * 2 ** (attempt - 1))
+            result['attempts'] = attempt + 1
+            try:
+                state, response = _send(hydrawiser, method, value, zone)
+            except RetryableError as error:
+                result['message'] = str(error)
+                continue
+            except RejectedError as error:
+                result['message'] = str(error)
+                break
+
+            result['state'] = state
+            if response is not None:
+                result['message'] = response.get('message')
+            elif state == STATE_INVALID:
+                result['message'] = 'Invalid zone {}.'.format(zone)
+            break
+
+        # Not fetched for commands on all zones of a lazy object.
+        result['controller_id'] = hydrawiser.__dict__.get('controller_id')
+
+        with lock:
+            results[key] = result
+            counter['completed'] += 1
+            if progress is not None:
+                progress(counter['completed'], len(pending), key, result)
+
+    if pending:
+        workers = max(1, min(max_workers, len(pending)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(work, pending))
+
+    return manifest
+
+
+def bulk_suspend(instances, days, zone=None, **kwargs):
+    """
+    Suspend or unsuspend a zone or all zones on many accounts.
+
+    See bulk_command() for the keyword arguments and the manifest.
+
+    :param instances: The Hydrawiser objects to command.
+    :type instances: iterable
+    :param days: Number of days to suspend the zone(s), 0 to unsuspend.
+    :type days: int
+    :param zone: The zone to suspend, None for all zones.
+    :type zone: int or None
+    :returns: The manifest.
+    :rtype: dict
+    """
+
+    return bulk_command(instances, 'suspend_zone', days, zone, **kwargs)
+
+
+def bulk_run(instances, minutes, zone=None, **kwargs):
+    """
+    Run or stop a zone or all zones on many accounts.
+
+    See bulk_command() for the keyword arguments and the manifest.
+
+    :param instances: The Hydrawiser objects to command.
+    :type instances: iterable
+    :param minutes: The number of minutes to run, 0 to stop.
+    :type minutes: int
+    :param zone: The zone to run, None for all zones.
+    :type zone: int or None
+    :returns: The manifest.
+    :rtype: dict
+    """
+
+    return bulk_command(instances, 'run_zone', minutes, zone, **kwargs)
+
+
+def failed_accounts(manifest):
+    """
+    Returns the accounts of a manifest that didn't complete.
+
+    :param manifest: A manifest returned by bulk_command().
+    :type manifest: dict
+    :returns: The account keys that failed or had an invalid zone.
+    :rtype: list
+    """
+
+    return sorted(key for key, result in manifest['results'].items()
+                  if result['state'] != STATE_DONE)
+
+
+def zone_tables(instances, refresh=True, max_workers=DEFAULT_WORKERS):
+    """
+    Returns the state of every zone of many controllers.
+
+    The controllers are refreshed concurrently and the columns of each
+    Hydrawiser.zone_table() are concatenated, with a controller_id column
+    added.
+
+    :param instances: The Hydrawiser objects to query.
+    :type instances: iterable
+    :param refresh: Fetch the controller information first.
+    :type refresh: boolean
+    :param max_workers: The maximum number of concurrent requests.
+    :type max_workers: int
+    :returns: Columns with one entry per zone of every controller.
+    :rtype: dict
+    """
+
+    instances = list(instances)
+    result = dict((column, []) for column in
+                  ('controller_id',) + ZONE_TABLE_COLUMNS)
+    if not instances:
+        return result
+
+    workers = max(1, min(max_workers, len(instances)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        tables = list(executor.map(lambda hw: hw.zone_table(refresh),
+                                   instances))
+
+    for hydrawiser, table in zip(instances, tables):
+        result['controller_id'].extend(
+            [hydrawiser.controller_id] * len(table['zone']))
+        for column, values in table.items():
+            result[column].extend(values)
+
+    return result
@@ -2,65 +2,372 @@
 Helper functions to query and send
 commands to the controller.
 """
+import hashlib
+import re
+import threading
+
+try:
+    from time import monotonic as _clock
+except ImportError:  # pragma: no cover
+    from time import time as _clock
+
 import requests
 
+API_URL = 'https://app.hydrawise.com/api/v1'
+
 REQUESTS_TIMEOUT = 10
 
+# Always ask for a compressed response.
+REQUEST_HEADERS = {'Accept-Encoding': 'gzip, deflate'}
+
+# Fields that change on every poll without the controller state changing.
+VOLATILE_FIELDS = ('last_contact', 'last_contact_readable', 'session_id')
+
+# Compiled patterns for payload_fingerprint(), keyed by the volatile fields.
+_PATTERNS = {}
+
+# The error message of the last response each thread decoded, see
+# last_error().
+_ERRORS = threading.local()
+
+# Function used to issue every GET request to the Hydrawise server. It takes
+# the same arguments as requests.get() and is swapped out by set_transport().
+_TRANSPORT = requests.get
+
+
+def set_transport(transport=None):
+    """
+    Replace the function used to send requests to the Hydrawise server.
+
+    :param transport: A callable with the same signature as requests.get()
+                      that returns a response object. If None is specified
+                      requests.get() is restored.
+    :type transport: callable or None
+    :returns: The transport that was previously installed.
+    :rtype: callable
+    """
+
+    global _TRANSPORT  # pylint: disable=global-statement
+
+    previous = _TRANSPORT
+    _TRANSPORT = requests.get if transport is None else transport
+    return previous
+
+
+def get_transport():
+    """
+    Returns the function currently used to send requests.
+
+    :returns: The installed transport.
+    :rtype: callable
+    """
+
+    return _TRANSPORT
+
+
+def last_error():
+    """
+    Returns the error message of the last response decoded by the calling
+    thread.
+
+    The request functions return None both when the server fails and when
+    it answers with an error message, such as for an invalid API key. Only
+    the second carries a message.
+
+    :returns: The error_msg of the response or None if it had none.
+    :rtype: string or None
+    """
+
+    return getattr(_ERRORS, 'message', None)
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """ The time budget of an operation ran out. """
+
+
+class Deadline():
+    """
+    A time budget shared by every request of an operation.
+
+    Each request is given the time that is left as its timeout, capped at
+    REQUESTS_TIMEOUT, and no request is sent once the budget is spent. The
+    timeout applies to connecting and to each read, so a request can
+    overrun the budget slightly on a slow connection.
+
+    :param budget: Seconds the operation may take.
+    :type budget: float
+    """
+
+    def __init__(self, budget):
+
+        self.budget = budget
+        self.expires = _clock() + budget
+
+    @classmethod
+    def coerce(cls, deadline):
+        """
+        Accept a Deadline, a number of seconds or None.
 
-def status_schedule(token):
+        :param deadline: The deadline or budget.
+        :type deadline: Deadline, float or None
+        :returns: The deadline or None if there is none.
+        :rtype: Deadline or None
+        """
+
+        if deadline is None or isinstance(deadline, cls):
+            return deadline
+        return cls(deadline)
+
+    def remaining(self):
+        """
+        Returns the seconds left, 0 if the budget is spent.
+
+        :rtype: float
+        """
+
+        return max(0.0, self.expires - _clock())
+
+    def timeout(self):
+        """
+        Returns the timeout for the next request.
+
+        :rtype: float
+        :raises DeadlineExceeded: The budget is spent.
+        """
+
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(
+                'Deadline of {}s exceeded.'.format(self.budget))
+        return min(REQUESTS_TIMEOUT, remaining)
+
+
+def _get(url, params=None, deadline=None):
+    """
+    Send a GET request through the installed transport.
+
+    :param url: The url to request.
+    :type url: string
+    :param params: Query string arguments.
+    :type params: dict or None
+    :param deadline: Time budget the request must fit in.
+    :type deadline: Deadline or None
+    :returns: The response object.
+    :rtype: requests.Response
+    :raises DeadlineExceeded: The deadline passed before or during the
+                              request.
+    """
+
+    _ERRORS.message = None
+
+    if deadline is None:
+        return _TRANSPORT(url, params=params, headers=REQUEST_HEADERS,
+                          timeout=REQUESTS_TIMEOUT)
+
+    try:
+        return _TRANSPORT(url, params=params, headers=REQUEST_HEADERS,
+                          timeout=deadline.timeout())
+    except requests.exceptions.Timeout as error:
+        if isinstance(error, DeadlineExceeded) or deadline.remaining() > 0:
+            raise
+        raise DeadlineExceeded(
+            'Deadline of {}s exceeded: {}'.format(deadline.budget, error))
+
+
+def _volatile_pattern(fields):
+    """
+    Returns a pattern matching the given fields and their values in a JSON
+    response.
+
+    :param fields: The field names.
+    :type fields: tuple
+    :returns: The compiled pattern.
+    :rtype: regular expression
+    """
+
+    pattern = r'"(?:{})"\s*:\s*(?:"(?:[^"\\]|\\.)*"|[^,}}\]]*)'.format(
+        '|'.join(re.escape(name) for name in fields))
+    return re.compile(pattern.encode('utf-8'))
+
+
+def payload_fingerprint(content, volatile=VOLATILE_FIELDS):
+    """
+    Returns a fingerprint of a raw response body.
+
+    :param content: The response body.
+    :type content: bytes
+    :param volatile: Fields left out of the fingerprint because they change
+                     without the controller state changing.
+    :type volatile: tuple
+    :returns: The fingerprint.
+    :rtype: bytes
+    """
+
+    if volatile:
+        if volatile not in _PATTERNS:
+            _PATTERNS[volatile] = _volatile_pattern(volatile)
+        content = _PATTERNS[volatile].sub(b'', content)
+
+    return hashlib.sha1(content).digest()
+
+
+class PayloadCache():
+    """
+    Remembers the last response of an endpoint so that an identical
+    response doesn't have to be decoded again.
+
+    :param volatile: Fields ignored when comparing responses.
+    :type volatile: tuple
+    """
+
+    __slots__ = ('volatile', 'fingerprint', 'payload', 'changed',
+                 'responses', 'unchanged')
+
+    def __init__(self, volatile=VOLATILE_FIELDS):
+
+        self.volatile = volatile
+        self.fingerprint = None
+        self.payload = None
+        self.changed = True
+        self.responses = 0
+        self.unchanged = 0
+
+    def lookup(self, content):
+        """
+        Check a response body against the remembered one.
+
+        :param content: The response body.
+        :type content: bytes
+        :returns: The fingerprint of the body and the remembered payload if
+                  it is unchanged, otherwise None.
+        :rtype: tuple
+        """
+
+        fingerprint = payload_fingerprint(content, self.volatile)
+
+        self.responses += 1
+        self.changed = fingerprint != self.fingerprint
+        if self.changed:
+            return fingerprint, None
+
+        self.unchanged += 1
+        return fingerprint, self.payload
+
+    def store(self, fingerprint, payload):
+        """
+        Remember a decoded response.
+
+        :param fingerprint: The fingerprint of the response body.
+        :type fingerprint: bytes
+        :param payload: The decoded response.
+        :type payload: dict
+        """
+
+        self.fingerprint = fingerprint
+        self.payload = payload
+
+    def reset(self):
+        """ Forget the remembered response. """
+
+        self.fingerprint = None
+        self.payload = None
+        self.changed = True
+
+
+def _decode(response, cache=None):
+    """
+    Decode a response from the Hydrawise server.
+
+    :param response: The response.
+    :type response: requests.Response
+    :param cache: The cache of the endpoint, if any.
+    :type cache: PayloadCache or None
+    :returns: The decoded response or None if there was an error.
+    :rtype: dict or None
+    """
+
+    if response.status_code != 200:
+        if cache is not None:
+            cache.reset()
+        return None
+
+    if cache is not None:
+        fingerprint, payload = cache.lookup(response.content)
+        if payload is not None:
+            return payload
+
+    payload = response.json()
+
+    if 'error_msg' in payload:
+        _ERRORS.message = payload['error_msg']
+        if cache is not None:
+            cache.reset()
+        return None
+
+    if cache is not None:
+        cache.store(fingerprint, payload)
+
+    return payload
+
+
+def status_schedule(token, cache=None, deadline=None):
     """
     Returns the json string from the Hydrawise server after calling
     statusschedule.php.
 
     :param token: The users API token.
     :type token: string
+    :param cache: Skips decoding when the response didn't change since the
+                  last call made with the same cache.
+    :type cache: PayloadCache or None
+    :param deadline: Time budget for the request, in seconds.
+    :type deadline: Deadline, float or None
     :returns: The response from the controller. If there was an error returns
               None.
     :rtype: string or None
     """
 
-    url = 'https://app.hydrawise.com/api/v1/statusschedule.php'
+    url = API_URL + '/statusschedule.php'
 
     payload = {
         'api_key': token}
 
-    get_response = requests.get(url, params=payload, timeout=REQUESTS_TIMEOUT)
+    get_response = _get(url, params=payload,
+                        deadline=Deadline.coerce(deadline))
 
-    if get_response.status_code == 200 and \
-       'error_msg' not in get_response.json():
-        return get_response.json()
+    return _decode(get_response, cache)
 
-    return None
 
-
-def customer_details(token):
+def customer_details(token, cache=None, deadline=None):
     """
     Returns the json string from the Hydrawise server after calling
     customerdetails.php.
 
     :param token: The users API token.
     :type token: string
+    :param cache: Skips decoding when the response didn't change since the
+                  last call made with the same cache.
+    :type cache: PayloadCache or None
+    :param deadline: Time budget for the request, in seconds.
+    :type deadline: Deadline, float or None
     :returns: The response from the controller. If there was an error returns
               None.
     :rtype: string or None.
     """
 
-    url = 'https://app.hydrawise.com/api/v1/customerdetails.php'
+    url = API_URL + '/customerdetails.php'
 
     payload = {
         'api_key': token,
         'type': 'controllers'}
 
-    get_response = requests.get(url, params=payload, timeout=REQUESTS_TIMEOUT)
-
-    if get_response.status_code == 200 and \
-       'error_msg' not in get_response.json():
-        return get_response.json()
+    get_response = _get(url, params=payload,
+                        deadline=Deadline.coerce(deadline))
 
-    return None
+    return _decode(get_response, cache)
 
 
-def set_zones(token, action, relay=None, time=None):
+def set_zones(token, action, relay=None, time=None, deadline=None):
     """
     Controls the zone relays to turn sprinklers on and off.
 
@@ -74,6 +381,8 @@ def set_zones(token, action, relay=None, time=None):
     :type relay: int or None
     :param time: The number of seconds to run or unix epoch time to suspend.
     :type time: int or None
+    :param deadline: Time budget for the request, in seconds.
+    :type deadline: Deadline, float or None
     :returns: The response from the controller. If there was an error returns
               None.
     :rtype: string or None
@@ -116,19 +425,14 @@ def set_zones(token, action, relay=None, time=None):
     if action in ['stop', 'run', 'suspend'] and relay is None:
         return None
 
-    get_response = requests.get('https://app.hydrawise.com/api/v1/'
-                                'setzone.php?'
-                                '&api_key={}'
-                                '&action={}{}{}{}'
-                                .format(token,
-                                        action,
-                                        relay_cmd,
-                                        period_cmd,
-                                        custom_cmd),
-                                timeout=REQUESTS_TIMEOUT)
-
-    if get_response.status_code == 200 and \
-       'error_msg' not in get_response.json():
-        return get_response.json()
-
-    return None
+    get_response = _get(API_URL + '/setzone.php?'
+                        '&api_key={}'
+                        '&action={}{}{}{}'
+                        .format(token,
+                                action,
+                                relay_cmd,
+                                period_cmd,
+                                custom_cmd),
+                        deadline=Deadline.coerce(deadline))
+
+    return _decode(get_response)
@@ -0,0 +1,409 @@
+"""
+Find out where the time and the API requests of an application go.
+
+While a Profiler is running, every public Hydrawiser method and the request
+functions of the helpers module are timed. The wall time of each call is
+split into network wait, response decoding and the rest (Python side
+work), and the requests it sent and the bytes it received are counted::
+
+    with Profiler() as profiler:
+        hw = Hydrawiser('0000-1111-2222-3333')
+        for zone in range(hw.num_relays):
+            hw.time_remaining(zone)
+
+    print(profiler.report())
+    profiler.dump_folded('hydrawiser.folded')
+
+The statistics of a method include everything it calls. Calls made from
+outside the library are also grouped by the file and line they were made
+from (the call site), so the call patterns causing the most requests stand
+out. dump_folded() writes the collapsed stack format read by flamegraph.pl
+and speedscope, with call sites at the root of the stacks.
+
+Profiling slows every call down and isn't meant to be left running.
+"""
+
+import functools
+import inspect
+import os
+import sys
+import threading
+
+try:
+    from time import perf_counter as _clock
+except ImportError:  # pragma: no cover
+    from time import time as _clock
+
+from hydrawiser import helpers
+from hydrawiser.core import Hydrawiser
+
+# Functions of the helpers module timed as frames.
+PROFILED_HELPERS = ('status_schedule', 'customer_details', 'set_zones')
+
+# Names of the phases in the folded stacks.
+NETWORK = 'network'
+DECODE = 'decode'
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(helpers.__file__))
+
+
+class CallStats():
+    """
+    Statistics of the calls of one method or call site. Times are in
+    seconds.
+    """
+
+    __slots__ = ('calls', 'requests', 'received', 'wall', 'network',
+                 'decode')
+
+    def __init__(self):
+
+        self.calls = 0
+        self.requests = 0
+        self.received = 0
+        self.wall = 0.0
+        self.network = 0.0
+        self.decode = 0.0
+
+    def add(self, frame, wall):
+        """ Add a finished call. """
+
+        self.calls += 1
+        self.requests += frame.requests
+        self.received += frame.received
+        self.wall += wall
+        self.network += frame.network
+        self.decode += frame.decode
+
+    def as_dict(self):
+        """
+        Returns the statistics.
+
+        :returns: calls, requests, requests_per_call, bytes (response bodies
+                  received), wall, network, decode and python (wall time
+                  spent outside of the other two).
+        :rtype: dict
+        """
+
+        return {'calls': self.calls,
+                'requests': self.requests,
+                'requests_per_call': float(self.requests) / self.calls,
+                'bytes': self.received,
+                'wall': self.wall,
+                'network': self.network,
+                'decode': self.decode,
+                'python': max(0.0, self.wall - self.network - self.decode)}
+
+
+class _Frame():
+    """ A call in progress. """
+
+    __slots__ = ('name', 'site', 'children', 'requests', 'received',
+                 'network', 'decode')
+
+    def __init__(self, name, site):
+
+        self.name = name
+        self.site = site
+        self.children = 0.0
+        self.requests = 0
+        self.received = 0
+        self.network = 0.0
+        self.decode = 0.0
+
+
+class Profiler():
+    """
+    Time the Hydrawiser methods and the requests they send.
+
+    :param cls: The class whose public methods are profiled.
+    :type cls: class
+    :param sites: Record the call site of calls made from outside the
+                  library.
+    :type sites: boolean
+    """
+
+    def __init__(self, cls=Hydrawiser, sites=True):
+
+        self.cls = cls
+        self.sites = sites
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {}
+        self._site_stats = {}
+        self._folded = {}
+        self._patched = []
+        self._previous = None
+
+    def _stack(self):
+        """ Returns the frames of the current thread. """
+
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    @staticmethod
+    def _call_site():
+        """ Returns the first caller outside of the library. """
+
+        frame = sys._getframe(2)  # pylint: disable=protected-access
+        while frame is not None:
+            filename = os.path.abspath(frame.f_code.co_filename)
+            if not filename.startswith(_PACKAGE_DIR + os.sep):
+                return '{}:{}:{}'.format(os.path.basename(filename),
+                                         frame.f_lineno,
+                                         frame.f_code.co_name)
+            frame = frame.f_back
+        return '<hydrawiser>'
+
+    @staticmethod
+    def _path(stack):
+        """ Returns the folded stack of the current frames. """
+
+        path = tuple(frame.name for frame in stack)
+        if stack and stack[0].site is not None:
+            path = (stack[0].site,) + path
+        return path
+
+    def _fold(self, path, seconds):
+        """ Add time to a folded stack. Called with the lock held. """
+
+        self._folded[path] = self._folded.get(path, 0.0) + seconds
+
+    def _call(self, name, function, args, kwargs):
+        """ Run a profiled function. """
+
+        stack = self._stack()
+        site = self._call_site() if self.sites and not stack else None
+
+        frame = _Frame(name, site)
+        stack.append(frame)
+        start = _clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            wall = _clock() - start
+            path = self._path(stack)
+            stack.pop()
+
+            if stack:
+                stack[-1].children += wall
+
+            with self._lock:
+                self._stats.setdefault(name, CallStats()).add(frame, wall)
+                if not stack and site is not None:
+                    self._site_stats.setdefault(
+                        (site, name), CallStats()).add(frame, wall)
+                self._fold(path, max(0.0, wall - frame.children))
+
+    def _phase(self, phase, seconds, received=None):
+        """
+        Charge network or decoding time to every frame of the thread.
+
+        :param received: The bytes received if a request was sent.
+        """
+
+        stack = self._stack()
+        for frame in stack:
+            setattr(frame, phase, getattr(frame, phase) + seconds)
+            if received is not None:
+                frame.requests += 1
+                frame.received += received
+
+        if stack:
+            stack[-1].children += seconds
+
+        with self._lock:
+            self._fold(self._path(stack) + (phase,), seconds)
+
+    def _transport(self, url, params=None, **kwargs):
+        """ Transport installed while profiling. """
+
+        start = _clock()
+        received = 0
+        try:
+            response = self._previous(url, params=params, **kwargs)
+            received = len(response.content or b'')
+            return response
+        finally:
+            self._phase(NETWORK, _clock() - start, received)
+
+    def _wrap(self, name, function):
+        """ Returns a profiled version of a function. """
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return self._call(name, function, args, kwargs)
+
+        return wrapper
+
+    def _wrap_decode(self, function):
+        """ Returns a version of helpers._decode() timed as a phase. """
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = _clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._phase(DECODE, _clock() - start)
+
+        return wrapper
+
+    def _patch(self, owner, name, value):
+        """ Replace an attribute, remembering the original. """
+
+        self._patched.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, value)
+
+    def start(self):
+        """
+        Start profiling.
+
+        :raises RuntimeError: The profiler is already running.
+        """
+
+        if self._patched:
+            raise RuntimeError('The profiler is already running.')
+
+        for name, member in sorted(vars(self.cls).items()):
+            if inspect.isfunction(member) and \
+               (not name.startswith('_') or name == '__init__'):
+                self._patch(self.cls, name, self._wrap(
+                    '{}.{}'.format(self.cls.__name__, name), member))
+
+        # The request functions are also imported by name into other
+        # modules, so replace every reference in the package.
+        modules = [module for module_name, module in list(sys.modules.items())
+                   if module is not None and
+                   (module_name == 'hydrawiser' or
+                    module_name.startswith('hydrawiser.'))]
+        for function_name in PROFILED_HELPERS:
+            function = getattr(helpers, function_name)
+            wrapper = self._wrap('helpers.' + function_name, function)
+            for module in modules:
+                for name, value in list(vars(module).items()):
+                    if value is function:
+                        self._patch(module, name, wrapper)
+
+        self._patch(helpers, '_decode', self._wrap_decode(helpers._decode))
+
+        self._previous = helpers.set_transport(self._transport)
+
+    def stop(self):
+        """ Stop profiling. The statistics are kept. """
+
+        helpers.set_transport(self._previous)
+        for owner, name, original in reversed(self._patched):
+            setattr(owner, name, original)
+        self._patched = []
+
+    def reset(self):
+        """ Forget the statistics collected so far. """
+
+        with self._lock:
+            self._stats = {}
+            self._site_stats = {}
+            self._folded = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def stats(self):
+        """
+        Returns the statistics of every profiled method.
+
+        :returns: The statistics keyed by method, see CallStats.as_dict().
+        :rtype: dict
+        """
+
+        with self._lock:
+            return dict((name, stats.as_dict())
+                        for name, stats in self._stats.items())
+
+    def site_stats(self):
+        """
+        Returns the statistics of calls made from outside the library.
+
+        :returns: The statistics keyed by (call site, method), see
+                  CallStats.as_dict().
+        :rtype: dict
+        """
+
+        with self._lock:
+            return dict((key, stats.as_dict())
+                        for key, stats in self._site_stats.items())
+
+    def folded(self):
+        """
+        Returns the profile in the collapsed stack format used by flame
+        graph tools, one stack per line with its time in microseconds.
+
+        :rtype: list
+        """
+
+        with self._lock:
+            folded = sorted(self._folded.items())
+
+        return ['{} {}'.format(';'.join(path), int(round(seconds * 1e6)))
+                for path, seconds in folded if path]
+
+    def dump_folded(self, path):
+        """
+        Write the profile in the collapsed stack format.
+
+        :param path: The file to write.
+        :type path: string
+        """
+
+        with open(path, 'w') as fdp:
+            for line in self.folded():
+                fdp.write(line)
+                fdp.write('\n')
+
+    def report(self, sort='requests', limit=20):
+        """
+        Returns the statistics as a table.
+
+        :param sort: The statistic to sort by, see CallStats.as_dict().
+        :type sort: string
+        :param limit: The maximum number of call sites listed.
+        :type limit: int
+        :returns: The report.
+        :rtype: string
+        """
+
+        header = '{:<60} {:>7} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10}'
+        row = '{:<60} {calls:>7} {requests_per_call:>8.2f} ' \
+            '{wall:>10.2f} {network:>10.2f} {decode:>10.2f} ' \
+            '{python:>10.2f} {bytes:>10}'
+
+        def lines(title, stats):
+            ordered = sorted(stats.items(), key=lambda item: item[1][sort],
+                             reverse=True)
+            result = [header.format(title, 'calls', 'req/call', 'wall ms',
+                                    'network ms', 'decode ms', 'python ms',
+                                    'bytes')]
+            for name, values in ordered[:limit]:
+                scaled = dict(values)
+                for key in ('wall', 'network', 'decode', 'python'):
+                    scaled[key] = values[key] * 1000
+                result.append(row.format(name[-60:], **scaled))
+            return result
+
+        report = lines('method', self.stats())
+
+        sites = dict(('{} {}'.format(site, name), values)
+                     for (site, name), values in self.site_stats().items())
+        if sites:
+            report.append('')
+            report.extend(lines('call site', sites))
+
+        return '\n'.join(report)
@@ -0,0 +1,331 @@
+"""
+Record and replay Hydrawise server traffic.
+
+A Recorder captures every request made through the helpers module together
+with the response and how long it took, and writes them to a gzip compressed
+JSON lines file. API keys are replaced with aliases (key-0, key-1, ...) before
+anything is written.
+
+A ReplayTransport reads that file back and answers requests without touching
+the network, so a fleet of Hydrawiser objects can be load tested offline.
+The recorded response times are always reproduced, the recorded time between
+requests only with pace=True.
+Use the aliases as the API keys of the replayed objects::
+
+    with Recorder('traffic.jsonl.gz'):
+        hw = Hydrawiser('0000-1111-2222-3333')
+        hw.is_zone_running(3)
+
+    with ReplayTransport.load('traffic.jsonl.gz', speed=10):
+        fleet = [Hydrawiser('key-0') for _ in range(100)]
+"""
+
+import gzip
+import json
+import re
+import threading
+import time
+
+try:
+    from urllib.parse import urlsplit, parse_qsl
+except ImportError:  # pragma: no cover
+    from urlparse import urlsplit, parse_qsl
+
+import requests
+from requests.models import PreparedRequest
+
+from hydrawiser import helpers
+
+API_KEY_RE = re.compile(r'(api_key=)([^&]*)')
+
+
+def _full_url(url, params=None):
+    """
+    Merge the query arguments into the url the same way requests does.
+
+    :param url: The url being requested.
+    :type url: string
+    :param params: Query string arguments.
+    :type params: dict or None
+    :returns: The url including the query string.
+    :rtype: string
+    """
+
+    prepared = PreparedRequest()
+    prepared.prepare_url(url, params)
+    return prepared.url
+
+
+def request_key(url):
+    """
+    Returns the key used to match a request against recorded traffic.
+
+    Requests are matched on the endpoint, the api key and the setzone action.
+    Other arguments such as the suspend time depend on when the request was
+    made and are ignored.
+
+    :param url: The full url including the query string.
+    :type url: string
+    :returns: (endpoint, api key, action)
+    :rtype: tuple
+    """
+
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    endpoint = parts.path.rsplit('/', 1)[-1]
+    return (endpoint, query.get('api_key'), query.get('action'))
+
+
+class ReplayResponse():
+    """
+    Minimal stand-in for requests.Response returned by the replay transport.
+
+    :param status_code: The HTTP status code.
+    :type status_code: int
+    :param body: The response body.
+    :type body: string
+    """
+
+    def __init__(self, status_code, body, url=None):
+
+        self.status_code = status_code
+        self.text = body
+        self.content = body.encode('utf-8')
+        self.url = url
+        self.headers = {'Content-Type': 'application/json'}
+
+    def json(self):
+        """
+        Decode the response body.
+
+        :returns: The decoded body.
+        :rtype: dict
+        """
+
+        return json.loads(self.text)
+
+
+class Recorder():
+    """
+    Capture requests made through the helpers module.
+
+    :param path: File to write the recording to when stopped. If None the
+                 recording is only kept in memory.
+    :type path: string or None
+    """
+
+    def __init__(self, path=None):
+
+        self.path = path
+        self.entries = []
+        self._aliases = {}
+        self._lock = threading.Lock()
+        self._started = None
+        self._previous = None
+
+    def _alias(self, match):
+        """ Replace an api key with its alias. """
+
+        token = match.group(2)
+        with self._lock:
+            if token not in self._aliases:
+                self._aliases[token] = 'key-{}'.format(len(self._aliases))
+            return match.group(1) + self._aliases[token]
+
+    def redact(self, url):
+        """
+        Replace every api key in a url with its alias.
+
+        :param url: The url to redact.
+        :type url: string
+        :returns: The redacted url.
+        :rtype: string
+        """
+
+        return API_KEY_RE.sub(self._alias, url)
+
+    def _transport(self, url, params=None, **kwargs):
+        """ Transport installed while recording. """
+
+        start = time.time()
+        response = self._previous(url, params=params, **kwargs)
+        elapsed = time.time() - start
+
+        entry = {
+            't': round(start - self._started, 4),
+            'd': round(elapsed, 4),
+            'u': self.redact(_full_url(url, params)),
+            's': response.status_code,
+            'b': response.text}
+
+        with self._lock:
+            self.entries.append(entry)
+
+        return response
+
+    def start(self):
+        """ Start recording. """
+
+        self._started = time.time()
+        self._previous = helpers.set_transport(self._transport)
+
+    def stop(self):
+        """ Stop recording and write the file if a path was given. """
+
+        helpers.set_transport(self._previous)
+        if self.path is not None:
+            self.save(self.path)
+
+    def save(self, path):
+        """
+        Write the recording.
+
+        :param path: The file to write.
+        :type path: string
+        """
+
+        with gzip.open(path, 'wt') as fdp:
+            for entry in sorted(self.entries, key=lambda e: e['t']):
+                fdp.write(json.dumps(entry, separators=(',', ':')))
+                fdp.write('\n')
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class ReplayTransport():
+    """
+    Answer requests from recorded traffic.
+
+    Responses for the same endpoint, api key and action are returned in the
+    order they were recorded. When they run out the sequence starts over if
+    loop is True, otherwise the last response keeps being returned.
+
+    By default only the recorded response times are reproduced and requests
+    are answered as soon as they are made. With pace set, a request is also
+    held back until as much time has passed since the first replayed request
+    as had passed in the recording, so the recorded arrival rate is
+    reproduced as well. Each pass of a loop starts where the previous one
+    ended.
+
+    :param entries: Recorded entries, as produced by Recorder.
+    :type entries: list
+    :param speed: Replay speed. 1 reproduces the recorded timing, 10 is ten
+                  times faster and 0 answers immediately.
+    :type speed: float
+    :param loop: Start over when the recorded responses run out.
+    :type loop: boolean
+    :param pace: Reproduce the recorded time between requests.
+    :type pace: boolean
+    """
+
+    def __init__(self, entries, speed=1.0, loop=True, pace=False):
+
+        self.speed = speed
+        self.loop = loop
+        self.pace = pace
+        self.requests = 0
+        self._responses = {}
+        self._position = {}
+        self._lock = threading.Lock()
+        self._previous = None
+        self._started = None
+        self._span = 0
+
+        for entry in sorted(entries, key=lambda e: e['t']):
+            self._responses.setdefault(request_key(entry['u']), []) \
+                .append(entry)
+            self._span = max(self._span, entry['t'] + entry['d'])
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Create a replay transport from a recording file.
+
+        :param path: The recording to read.
+        :type path: string
+        :returns: ReplayTransport object.
+        :rtype: object
+        """
+
+        with gzip.open(path, 'rt') as fdp:
+            entries = [json.loads(line) for line in fdp if line.strip()]
+        return cls(entries, **kwargs)
+
+    def _next_entry(self, key):
+        """
+        Returns the next recorded entry for a request key and the offset of
+        the current pass of the loop.
+        """
+
+        with self._lock:
+            self.requests += 1
+            if self._started is None:
+                self._started = time.time()
+
+            responses = self._responses.get(key)
+            if not responses:
+                return None, 0
+
+            count = self._position.get(key, 0)
+            self._position[key] = count + 1
+            if self.loop:
+                return (responses[count % len(responses)],
+                        count // len(responses) * self._span)
+            return responses[min(count, len(responses) - 1)], 0
+
+    def __call__(self, url, params=None, **kwargs):
+
+        full_url = _full_url(url, params)
+        entry, offset = self._next_entry(request_key(full_url))
+
+        if entry is None:
+            return ReplayResponse(404, '{"error_msg": "not recorded"}',
+                                  full_url)
+
+        if self.speed:
+            if self.pace:
+                # Wait until the request was sent in the recording.
+                due = self._started + (offset + entry['t']) / self.speed
+                time.sleep(max(0, due - time.time()))
+
+            delay = entry['d'] / self.speed
+            timeout = kwargs.get('timeout')
+            if timeout is not None and delay > timeout:
+                time.sleep(timeout)
+                raise requests.exceptions.ReadTimeout(
+                    'Replayed response took longer than {}s.'.format(timeout))
+            time.sleep(delay)
+
+        return ReplayResponse(entry['s'], entry['b'], full_url)
+
+    def start(self):
+        """ Install the transport. """
+
+        self._previous = helpers.set_transport(self)
+
+    def stop(self):
+        """ Restore the previous transport. """
+
+        helpers.set_transport(self._previous)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_previous'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
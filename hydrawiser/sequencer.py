@@ -0,0 +1,285 @@
+"""
+Run watering programs on many controllers from a single scheduler.
+
+A program is a list of steps: run a zone for some minutes, or soak (wait)
+for some minutes. Every pending step of every controller is kept in one
+heap and dispatched by a single scheduler thread, and the commands are sent
+by a bounded pool of worker threads::
+
+    program = [Step(0, 10), Step(1, 8), Soak(20)]
+
+    with Sequencer(max_workers=8) as sequencer:
+        for hw in fleet:
+            sequencer.add(hw, program, repeat=2)
+        sequencer.wait()
+
+When a zone should have finished, the controller is refreshed. If it is
+still running, for example because it started late, the next step waits
+for the time_left reported by the controller instead of drifting.
+"""
+
+import collections
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 8
+
+# A zone still running with no more than this many seconds left is treated
+# as finished.
+DEFAULT_TOLERANCE = 10
+
+# Run a zone (index into relays, None for all zones) for some minutes.
+Step = collections.namedtuple('Step', 'zone minutes')
+
+# Wait a number of minutes before the next step.
+Soak = collections.namedtuple('Soak', 'minutes')
+
+# Events kept in the scheduler heap.
+_DISPATCH = 'dispatch'
+_CHECK = 'check'
+
+
+class Sequencer():
+    """
+    Runs watering programs on many controllers.
+
+    :param max_workers: The maximum number of commands sent at once.
+    :type max_workers: int
+    :param tolerance: Seconds of time_left below which a zone is treated as
+                      finished.
+    :type tolerance: int
+    :param time_scale: Multiplies every wait. Lower it to try programs out
+                       quickly.
+    :type time_scale: float
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS,
+                 tolerance=DEFAULT_TOLERANCE, time_scale=1.0):
+
+        self.tolerance = tolerance
+        self.time_scale = time_scale
+
+        self._max_workers = max_workers
+        self._heap = []
+        self._counter = itertools.count()
+        self._programs = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._running = False
+
+    def add(self, hydrawiser, steps, repeat=1, delay=0):
+        """
+        Schedule a program on a controller.
+
+        :param hydrawiser: The controller to run the program on.
+        :type hydrawiser: Hydrawiser
+        :param steps: The Step and Soak entries of the program.
+        :type steps: list
+        :param repeat: The number of times to run the steps.
+        :type repeat: int
+        :param delay: Minutes to wait before the first step.
+        :type delay: float
+        :returns: The program id.
+        :rtype: int
+        """
+
+        program_id = next(self._counter)
+        with self._condition:
+            self._programs[program_id] = {
+                'hydrawiser': hydrawiser,
+                'steps': list(steps) * repeat,
+                'step': 0,
+                'done': False,
+                'cancelled': False,
+                'errors': []}
+            self._push(delay * 60, program_id, _DISPATCH)
+        return program_id
+
+    def cancel(self, program_id):
+        """
+        Stop scheduling a program. A zone that is already running is not
+        stopped.
+
+        :param program_id: The program returned by add().
+        :type program_id: int
+        """
+
+        with self._condition:
+            program = self._programs[program_id]
+            program['cancelled'] = True
+            program['done'] = True
+            self._condition.notify_all()
+
+    def status(self, program_id):
+        """
+        Returns the progress of a program.
+
+        :param program_id: The program returned by add().
+        :type program_id: int
+        :returns: step is the index of the current step, done whether the
+                  program finished, errors the steps whose command failed.
+        :rtype: dict
+        """
+
+        with self._condition:
+            program = self._programs[program_id]
+            return {'step': program['step'],
+                    'steps': len(program['steps']),
+                    'done': program['done'],
+                    'cancelled': program['cancelled'],
+                    'errors': list(program['errors'])}
+
+    def pending(self):
+        """
+        Returns the number of events waiting in the scheduler.
+
+        :rtype: int
+        """
+
+        with self._condition:
+            return len(self._heap)
+
+    def start(self):
+        """ Start the scheduler thread. """
+
+        self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        self._thread = threading.Thread(target=self._run,
+                                        name='hydrawiser-sequencer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stop the scheduler. Pending steps are dropped. """
+
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def wait(self, timeout=None):
+        """
+        Wait until every program is done.
+
+        :param timeout: Seconds to wait, or None to wait forever.
+        :type timeout: float or None
+        :returns: True if every program is done.
+        :rtype: boolean
+        """
+
+        end = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while not all(program['done']
+                          for program in self._programs.values()):
+                remaining = None if end is None else end - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _push(self, seconds, program_id, action):
+        """ Schedule an event. Must be called with the condition held. """
+
+        when = time.time() + seconds * self.time_scale
+        heapq.heappush(self._heap,
+                       (when, next(self._counter), program_id, action))
+        self._condition.notify_all()
+
+    def _run(self):
+        """ The scheduler loop. """
+
+        with self._condition:
+            while self._running:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+
+                delay = self._heap[0][0] - time.time()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+
+                _, _, program_id, action = heapq.heappop(self._heap)
+                program = self._programs[program_id]
+                if program['cancelled']:
+                    continue
+
+                if action == _DISPATCH:
+                    self._dispatch(program_id, program)
+                else:
+                    self._executor.submit(self._check, program_id, program)
+
+    def _dispatch(self, program_id, program):
+        """ Start the current step. Called with the condition held. """
+
+        if program['step'] >= len(program['steps']):
+            program['done'] = True
+            self._condition.notify_all()
+            return
+
+        step = program['steps'][program['step']]
+        if isinstance(step, Soak):
+            program['step'] += 1
+            self._push(step.minutes * 60, program_id, _DISPATCH)
+        else:
+            self._executor.submit(self._send, program_id, program, step)
+
+    def _send(self, program_id, program, step):
+        """ Send the run command of a step from a worker thread. """
+
+        try:
+            response = program['hydrawiser'].run_zone(step.minutes, step.zone)
+        except Exception:  # pylint: disable=broad-except
+            response = None
+
+        with self._condition:
+            if response is None:
+                program['errors'].append(program['step'])
+                program['step'] += 1
+                self._push(0, program_id, _DISPATCH)
+            else:
+                self._push(step.minutes * 60, program_id, _CHECK)
+
+    def _check(self, program_id, program):
+        """
+        Compare the controller with the schedule from a worker thread once a
+        zone should have finished.
+        """
+
+        hydrawiser = program['hydrawiser']
+        step = program['steps'][program['step']]
+        time_left = 0
+
+        try:
+            if hydrawiser.update_controller_info():
+                if step.zone is None:
+                    relays = hydrawiser.relays
+                else:
+                    relays = [hydrawiser.relays[step.zone]]
+                relay_ids = set(str(relay['relay_id']) for relay in relays)
+                for entry in hydrawiser.running or []:
+                    if str(entry['relay_id']) in relay_ids:
+                        time_left = max(time_left, int(entry['time_left']))
+        except Exception:  # pylint: disable=broad-except
+            time_left = 0
+
+        with self._condition:
+            if time_left > self.tolerance:
+                # Still running, check again when the controller says it
+                # will be done.
+                self._push(time_left, program_id, _CHECK)
+            else:
+                program['step'] += 1
+                self._push(0, program_id, _DISPATCH)
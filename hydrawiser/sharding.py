@@ -0,0 +1,384 @@
+"""
+Poll large fleets from several processes.
+
+A single interpreter decoding statusschedule.php responses for thousands of
+controllers is limited by the GIL. ShardedPoller spreads the accounts over a
+pool of worker processes. Each worker owns the Hydrawiser objects of its
+accounts and polls them on its own; whenever the data of a controller
+changes the worker sends its snapshot (see Hydrawiser.snapshot()) back to
+the parent through its own queue::
+
+    with ShardedPoller(tokens, processes=4, interval=60) as poller:
+        while True:
+            for token in poller.poll(timeout=5):
+                snapshot = poller.snapshots[token]
+                if snapshot is None:
+                    # The account couldn't be read.
+                    continue
+                hw = Hydrawiser.from_snapshot(snapshot, token)
+
+Accounts are assigned to workers with rendezvous hashing, so adding or
+removing accounts, or changing the number of processes, only moves the
+accounts whose owner actually changes. A worker that dies is restarted by
+poll() and polls its accounts again. A worker that keeps dying is restarted
+less and less often, up to once every RESTART_BACKOFF_MAX seconds.
+"""
+
+import hashlib
+import multiprocessing
+import time
+
+try:
+    import queue
+except ImportError:  # pragma: no cover
+    import Queue as queue
+
+from hydrawiser import helpers
+from hydrawiser.core import Hydrawiser
+
+DEFAULT_INTERVAL = 60
+
+# Seconds between checks of the result queues while poll() waits.
+POLL_INTERVAL = 0.05
+
+# Seconds before a worker that died again is restarted. The wait doubles
+# with every restart, and starts over once a worker has lived longer than
+# the longest wait.
+RESTART_BACKOFF = 1.0
+RESTART_BACKOFF_MAX = 60.0
+
+# Commands sent to the workers.
+CMD_ADD = 'add'
+CMD_REMOVE = 'remove'
+CMD_STOP = 'stop'
+
+
+def shard_for(token, shards):
+    """
+    Returns the shard that owns an account.
+
+    :param token: The account API key.
+    :type token: string
+    :param shards: The number of shards.
+    :type shards: int
+    :returns: The shard number, from 0 to shards - 1.
+    :rtype: int
+    """
+
+    def score(shard):
+        value = '{}:{}'.format(shard, token).encode('utf-8')
+        return hashlib.sha1(value).digest()
+
+    return max(range(shards), key=score)
+
+
+def _worker(shard, commands, results, interval, transport):
+    """
+    Poll the accounts owned by one shard until told to stop.
+
+    Snapshots are sent as (shard, token, snapshot) and only when they
+    changed. The snapshot is None when the account couldn't be read, for
+    any reason, so that one account can't bring down the worker.
+    """
+
+    if transport is not None:
+        helpers.set_transport(transport)
+
+    instances = {}
+    sent = {}
+    due = {}
+
+    while True:
+        for token in [token for token, when in due.items()
+                      if when <= time.time()]:
+            hydrawiser = instances[token]
+            try:
+                updated = hydrawiser.update_controller_info()
+                snapshot = hydrawiser.snapshot() if updated else None
+            except Exception:  # pylint: disable=broad-except
+                snapshot = None
+
+            if token not in sent or sent[token] != snapshot:
+                sent[token] = snapshot
+                results.put((shard, token, snapshot))
+            due[token] = time.time() + interval
+
+        timeout = max(0, min(due.values()) - time.time()) if due else None
+        try:
+            command, token = commands.get(timeout=timeout)
+        except queue.Empty:
+            continue
+
+        if command == CMD_ADD:
+            instances[token] = Hydrawiser(token, lazy=True, compact=True)
+            due[token] = 0
+        elif command == CMD_REMOVE:
+            instances.pop(token, None)
+            sent.pop(token, None)
+            due.pop(token, None)
+        elif command == CMD_STOP:
+            return
+
+
+class ShardedPoller():
+    """
+    Poll many accounts from a pool of worker processes.
+
+    :param tokens: The API keys of the accounts to poll.
+    :type tokens: iterable
+    :param processes: The number of worker processes. Defaults to the number
+                      of CPUs.
+    :type processes: int or None
+    :param interval: Seconds between polls of the same account.
+    :type interval: float
+    :param transport: Transport installed in the workers, see
+                      helpers.set_transport(). It must be picklable.
+    :type transport: callable or None
+    :param context: The multiprocessing context to start workers with.
+    :type context: multiprocessing context or None
+    """
+
+    def __init__(self, tokens=(), processes=None, interval=DEFAULT_INTERVAL,
+                 transport=None, context=None):
+
+        self.interval = interval
+        self.snapshots = {}
+        self.restarts = 0
+
+        self._processes = processes or multiprocessing.cpu_count()
+        self._transport = transport
+        self._context = context or multiprocessing
+        self._owners = dict((token, None) for token in tokens)
+        # (process, commands, results) of each shard.
+        self._workers = []
+        # When the worker of each shard was started, and the number of
+        # restarts in a row and the earliest time of the next one.
+        self._spawned = {}
+        self._backoff = {}
+
+    @property
+    def processes(self):
+        """
+        The number of worker processes.
+
+        :rtype: int
+        """
+
+        return self._processes
+
+    def owner(self, token):
+        """
+        Returns the worker that polls an account.
+
+        :param token: The account API key.
+        :type token: string
+        :returns: The worker number or None if the account isn't polled.
+        :rtype: int or None
+        """
+
+        return self._owners.get(token)
+
+    def _spawn(self, shard):
+        """
+        Start a worker process for a shard.
+
+        Every worker writes to its own result queue. A worker killed while
+        writing can leave the lock of its queue held, so the queue is
+        replaced along with the worker.
+
+        :returns: The process, its command queue and its result queue.
+        :rtype: tuple
+        """
+
+        commands = self._context.Queue()
+        results = self._context.Queue()
+        process = self._context.Process(
+            target=_worker,
+            args=(shard, commands, results, self.interval, self._transport))
+        process.daemon = True
+        process.start()
+        self._spawned[shard] = time.time()
+        return process, commands, results
+
+    def _start_worker(self, shard):
+        """ Start the worker process for a shard. """
+
+        self._workers.append(self._spawn(shard))
+
+    def _restart_dead_workers(self):
+        """
+        Replace the workers that died and hand them their accounts. Results
+        the dead worker didn't deliver are dropped, the new worker sends
+        every snapshot again. Workers that die again soon after a restart
+        are restarted with a growing delay.
+        """
+
+        now = time.time()
+
+        for shard, (process, _, _) in enumerate(self._workers):
+            if process.is_alive():
+                continue
+
+            failures, not_before = self._backoff.get(shard, (0, 0))
+            if now < not_before:
+                continue
+            if now - self._spawned[shard] > RESTART_BACKOFF_MAX:
+                failures = 0
+
+            process.join()
+            self._workers[shard] = self._spawn(shard)
+            self.restarts += 1
+            self._backoff[shard] = (
+                failures + 1,
+                now + min(RESTART_BACKOFF_MAX,
+                          RESTART_BACKOFF * 2 ** failures))
+            for token, owner in self._owners.items():
+                if owner == shard:
+                    self._workers[shard][1].put((CMD_ADD, token))
+
+    def _assign(self, token, shard):
+        """ Move an account to a shard. """
+
+        current = self._owners.get(token)
+        if current == shard:
+            return
+        if current is not None:
+            self._workers[current][1].put((CMD_REMOVE, token))
+        self._owners[token] = shard
+        self._workers[shard][1].put((CMD_ADD, token))
+
+    @staticmethod
+    def _stop_workers(workers):
+        """
+        Stop worker processes. Their pending results are dropped so that
+        none of them blocks on a full queue while exiting.
+        """
+
+        for _, commands, _ in workers:
+            commands.put((CMD_STOP, None))
+        for process, _, results in workers:
+            while process.is_alive():
+                process.join(POLL_INTERVAL)
+                try:
+                    while True:
+                        results.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def start(self):
+        """ Start the worker processes and hand out the accounts. """
+
+        for shard in range(self._processes):
+            self._start_worker(shard)
+
+        for token in list(self._owners):
+            self._owners[token] = None
+            self._assign(token, shard_for(token, self._processes))
+
+    def stop(self):
+        """ Stop the worker processes. """
+
+        self._stop_workers(self._workers)
+        self._workers = []
+        self._backoff = {}
+
+    def add(self, token):
+        """
+        Start polling an account.
+
+        :param token: The account API key.
+        :type token: string
+        """
+
+        if self._workers:
+            self._assign(token, shard_for(token, self._processes))
+        else:
+            self._owners.setdefault(token, None)
+
+    def remove(self, token):
+        """
+        Stop polling an account and forget its snapshot.
+
+        :param token: The account API key.
+        :type token: string
+        """
+
+        shard = self._owners.pop(token, None)
+        if shard is not None:
+            self._workers[shard][1].put((CMD_REMOVE, token))
+        self.snapshots.pop(token, None)
+
+    def resize(self, processes):
+        """
+        Change the number of worker processes and move the accounts whose
+        owner changed.
+
+        :param processes: The new number of worker processes.
+        :type processes: int
+        """
+
+        if processes < 1:
+            raise ValueError('At least one process is required.')
+
+        previous = self._processes
+        self._processes = processes
+
+        if not self._workers:
+            return
+
+        for shard in range(previous, processes):
+            self._start_worker(shard)
+
+        for token in list(self._owners):
+            self._assign(token, shard_for(token, processes))
+
+        # Their accounts moved, so their pending results are stale.
+        self._stop_workers(self._workers[processes:])
+        del self._workers[processes:]
+        for shard in range(processes, previous):
+            self._spawned.pop(shard, None)
+            self._backoff.pop(shard, None)
+
+    def poll(self, timeout=0):
+        """
+        Collect the snapshots sent by the workers. Workers that died are
+        restarted first.
+
+        :param timeout: Seconds to wait for the first snapshot.
+        :type timeout: float
+        :returns: The accounts whose snapshot changed.
+        :rtype: list
+        """
+
+        self._restart_dead_workers()
+
+        updated = []
+        end = time.time() + timeout
+
+        while True:
+            for _, _, results in self._workers:
+                while True:
+                    try:
+                        shard, token, snapshot = results.get_nowait()
+                    except queue.Empty:
+                        break
+
+                    # Ignore snapshots sent before an account moved or was
+                    # removed.
+                    if self._owners.get(token) != shard:
+                        continue
+
+                    self.snapshots[token] = snapshot
+                    updated.append(token)
+
+            remaining = end - time.time()
+            if updated or remaining <= 0:
+                return updated
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
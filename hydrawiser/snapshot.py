@@ -0,0 +1,158 @@
+"""
+Serialize Hydrawiser objects for caching and sending between processes.
+
+dumps() writes the snapshot of an object (see Hydrawiser.snapshot()) in a
+small versioned binary format, or as JSON. loads() turns either back into a
+working Hydrawiser object without contacting the server::
+
+    data = dumps(hw)
+    hw = loads(data, user_token='0000-1111-2222-3333')
+
+The binary format uses marshal, which is fast but must only be used with
+data from a trusted source, such as your own cache. Use binary=False to
+exchange snapshots with anything else.
+"""
+
+import json
+import marshal
+import weakref
+
+from hydrawiser.core import Hydrawiser
+from hydrawiser.storage import SharedDict
+
+# Every encoded snapshot starts with MAGIC, FORMAT_VERSION and the codec.
+MAGIC = b'HWS'
+FORMAT_VERSION = 1
+CODEC_MARSHAL = b'M'
+CODEC_JSON = b'J'
+
+MARSHAL_VERSION = 4
+
+# Encoded snapshots of compact objects, keyed by the id of their shared
+# status. Entries are removed when the status is released.
+_ENCODED = {}
+
+
+def _plain(value):
+    """ Convert shared containers into plain dicts and lists. """
+
+    if isinstance(value, dict):
+        return {name: _plain(item) for name, item in value.items()}
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+def encode(snapshot, binary=True):
+    """
+    Encode a snapshot.
+
+    :param snapshot: A snapshot returned by Hydrawiser.snapshot().
+    :type snapshot: dict
+    :param binary: Use the binary format, otherwise JSON.
+    :type binary: boolean
+    :returns: The encoded snapshot.
+    :rtype: bytes
+    """
+
+    header = MAGIC + bytearray([FORMAT_VERSION])
+
+    if binary:
+        try:
+            body = marshal.dumps(snapshot, MARSHAL_VERSION)
+        except ValueError:
+            # marshal doesn't take the shared containers of compact objects.
+            body = marshal.dumps(_plain(snapshot), MARSHAL_VERSION)
+        return bytes(header + CODEC_MARSHAL + body)
+
+    return bytes(header + CODEC_JSON +
+                 json.dumps(snapshot, separators=(',', ':')).encode('utf-8'))
+
+
+def decode(data):
+    """
+    Decode a snapshot.
+
+    Plain JSON without the header is accepted as well.
+
+    :param data: The encoded snapshot.
+    :type data: bytes
+    :returns: The snapshot.
+    :rtype: dict
+    :raises ValueError: The data isn't a snapshot or its version isn't
+                        supported.
+    """
+
+    if data[:1] == b'{':
+        return json.loads(data.decode('utf-8'))
+
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a Hydrawiser snapshot.')
+
+    version = bytearray(data[len(MAGIC):len(MAGIC) + 1])[0]
+    if version != FORMAT_VERSION:
+        raise ValueError('Unsupported snapshot format {}.'.format(version))
+
+    codec = data[len(MAGIC) + 1:len(MAGIC) + 2]
+    body = data[len(MAGIC) + 2:]
+
+    if codec == CODEC_MARSHAL:
+        return marshal.loads(body)
+    if codec == CODEC_JSON:
+        return json.loads(body.decode('utf-8'))
+
+    raise ValueError('Unknown snapshot codec {!r}.'.format(codec))
+
+
+def dumps(hydrawiser, binary=True):
+    """
+    Serialize a Hydrawiser object. The API key is not included.
+
+    :param hydrawiser: The object to serialize.
+    :type hydrawiser: Hydrawiser
+    :param binary: Use the binary format, otherwise JSON.
+    :type binary: boolean
+    :returns: The encoded snapshot.
+    :rtype: bytes
+    """
+
+    state = hydrawiser.snapshot()
+    status = state['controller_status']
+
+    # Compact objects share their data until it changes, so the encoding of
+    # an unchanged object can be reused.
+    shared = isinstance(status, SharedDict)
+    if shared:
+        cached = _ENCODED.get(id(status))
+        if cached is not None and cached[0]() is status and \
+           cached[1] is state['controller_info'] and cached[2] == binary:
+            return cached[3]
+
+    data = encode(state, binary)
+
+    if shared:
+        key = id(status)
+        _ENCODED[key] = (
+            weakref.ref(status, lambda ref, key=key: _ENCODED.pop(key, None)),
+            state['controller_info'], binary, data)
+
+    return data
+
+
+def loads(data, user_token=None, compact=False):
+    """
+    Rebuild a Hydrawiser object without contacting the server.
+
+    :param data: Data returned by dumps().
+    :type data: bytes
+    :param user_token: User account API key. Needed to send commands or
+                       refresh the object.
+    :type user_token: string or None
+    :param compact: See the compact argument of Hydrawiser. Compacting
+                    makes loading several times slower.
+    :type compact: boolean
+    :returns: Hydrawiser object.
+    :rtype: object
+    """
+
+    return Hydrawiser.from_snapshot(decode(data), user_token, compact)
@@ -0,0 +1,198 @@
+"""
+Compact storage of controller data.
+
+The server responses contain a lot that the Hydrawiser object never uses:
+billing plans, weather icon urls, observation text and so on. When many
+objects are kept in memory that adds up. The functions here reduce the
+responses to the fields the library uses, intern short strings, and share
+equal pieces (the controller topology, relays, sensors and forecast days)
+between every object in the process.
+
+Shared data must be treated as read-only.
+"""
+
+import hashlib
+import threading
+import weakref
+
+try:
+    from sys import intern
+except ImportError:  # pragma: no cover
+    pass  # Python 2 has intern() as a builtin.
+
+# Fields kept from customerdetails.php.
+INFO_FIELDS = ('customer_id', 'controller_id', 'controllers')
+
+# Fields kept for each controller in customerdetails.php.
+CONTROLLER_FIELDS = ('name', 'controller_id', 'customer_id', 'status',
+                     'last_contact', 'online')
+
+# Fields kept from statusschedule.php.
+STATUS_FIELDS = ('controller_id', 'customer_id', 'nextpoll', 'status',
+                 'name', 'message', 'obs_rain', 'relays', 'running',
+                 'sensors', 'forecast')
+
+# Fields kept for each sensor.
+SENSOR_FIELDS = ('name', 'type', 'mode', 'active', 'relays')
+
+# Fields kept for each forecast day.
+FORECAST_FIELDS = ('day', 'conditions', 'pop', 'temp_hi', 'temp_lo')
+
+# Strings longer than this are not interned.
+INTERN_LIMIT = 64
+
+
+class SharedDict(dict):
+    """ A dictionary that can be shared between Hydrawiser objects. """
+
+    __slots__ = ('__weakref__',)
+
+
+class SharedList(list):
+    """ A list that can be shared between Hydrawiser objects. """
+
+    __slots__ = ('__weakref__',)
+
+
+# Every shared container currently alive, keyed by its contents.
+_SHARED = weakref.WeakValueDictionary()
+_SHARED_LOCK = threading.Lock()
+
+
+def _share(container, key):
+    """ Returns an equal container that is already shared, or this one. """
+
+    with _SHARED_LOCK:
+        shared = _SHARED.get(key)
+        if shared is None:
+            _SHARED[key] = shared = container
+        return shared
+
+
+def _digest(parts):
+    """ Returns a short key identifying a container from its parts. """
+
+    return hashlib.sha1(repr(parts).encode('utf-8')).digest()
+
+
+def _compact(value):
+    """
+    Intern the strings of a decoded JSON value and share its containers.
+
+    :returns: (compacted value, key identifying its contents)
+    :rtype: tuple
+    """
+
+    if isinstance(value, dict):
+        items = sorted((intern(str(name)),) + _compact(item)
+                       for name, item in value.items())
+        key = _digest(('d',) + tuple((name, key) for name, _, key in items))
+        result = SharedDict((name, item) for name, item, _ in items)
+        return _share(result, key), key
+
+    if isinstance(value, list):
+        items = [_compact(item) for item in value]
+        key = _digest(('l',) + tuple(key for _, key in items))
+        return _share(SharedList(item for item, _ in items), key), key
+
+    if isinstance(value, str) and len(value) <= INTERN_LIMIT:
+        value = intern(value)
+
+    return value, (type(value).__name__, value)
+
+
+def _select(data, fields):
+    """ Returns only the named fields that are present. """
+
+    return dict((name, data[name]) for name in fields if name in data)
+
+
+def select_info(info):
+    """
+    Reduce a customerdetails.php response to the fields the library uses,
+    without interning or sharing anything. The result shares its nested
+    data with the response.
+
+    :param info: The decoded response.
+    :type info: dict or None
+    :returns: The reduced response or None.
+    :rtype: dict or None
+    """
+
+    if info is None:
+        return None
+
+    result = _select(info, INFO_FIELDS)
+    result['controllers'] = [_select(controller, CONTROLLER_FIELDS)
+                             for controller in info.get('controllers', [])]
+    return result
+
+
+def select_status(status):
+    """
+    Reduce a statusschedule.php response to the fields the library uses,
+    without interning or sharing anything. The result shares its nested
+    data with the response.
+
+    Relays are kept whole because relay_info() can return any of their
+    attributes.
+
+    :param status: The decoded response.
+    :type status: dict or None
+    :returns: The reduced response or None.
+    :rtype: dict or None
+    """
+
+    if status is None:
+        return None
+
+    result = _select(status, STATUS_FIELDS)
+    if 'sensors' in result:
+        result['sensors'] = [_select(sensor, SENSOR_FIELDS)
+                             for sensor in result['sensors']]
+    if 'forecast' in result:
+        result['forecast'] = [_select(day, FORECAST_FIELDS)
+                              for day in result['forecast']]
+    return result
+
+
+def compact_info(info):
+    """
+    Reduce a customerdetails.php response to the fields the library uses,
+    intern its strings and share its containers.
+
+    :param info: The decoded response.
+    :type info: dict or None
+    :returns: The compacted response or None.
+    :rtype: dict or None
+    """
+
+    if info is None:
+        return None
+    return _compact(select_info(info))[0]
+
+
+def compact_status(status):
+    """
+    Reduce a statusschedule.php response to the fields the library uses,
+    intern its strings and share its containers.
+
+    :param status: The decoded response.
+    :type status: dict or None
+    :returns: The compacted response or None.
+    :rtype: dict or None
+    """
+
+    if status is None:
+        return None
+    return _compact(select_status(status))[0]
+
+
+def shared_count():
+    """
+    Returns the number of shared containers currently alive.
+
+    :rtype: int
+    """
+
+    return len(_SHARED)
@@ -14,7 +14,8 @@ setup(
     url='https://github.com/ptcryan/hydrawiser',
     license='MIT',
     include_package_data=True,
-    install_requires=['requests>=2.0'],
+    install_requires=['requests>=2.0',
+                      'futures; python_version < "3"'],
     platforms='any',
     test_suite='tests',
     keywords=[
@@ -1,6 +1,7 @@
 from tests.test_base import UnitTestBase
 import requests_mock
-from tests.const import SET_ZONE, STATUS_SCHEDULE, CUSTOMER_DETAILS
+from tests.const import (SET_ZONE, STATUS_SCHEDULE, CUSTOMER_DETAILS,
+                         GOOD_API_KEY)
 from tests.extras import load_fixture
 
 
@@ -128,3 +129,158 @@ class TestHydrawiserCore(UnitTestBase):
         # Fixture has zone 3 running with 297 seconds remaining.
         self.assertEqual(self.rdy.time_remaining(3), 297)
         self.assertEqual(self.rdy.time_remaining(2), 0)
+
+    @requests_mock.Mocker()
+    def test_lazy(self, mock):
+        """ Test that a lazy object only fetches on first access. """
+        from hydrawiser.core import Hydrawiser
+
+        mock.get(STATUS_SCHEDULE, text=load_fixture('statusschedule.json'))
+        mock.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+
+        rdy = Hydrawiser(GOOD_API_KEY, lazy=True)
+        self.assertFalse(rdy.loaded)
+        self.assertEqual(mock.call_count, 0)
+        self.assertEqual(repr(rdy), '<Hydrawiser: None>')
+
+        self.assertEqual(rdy.num_relays, 6)
+        self.assertTrue(rdy.loaded)
+        self.assertEqual(mock.call_count, 2)
+
+        self.assertEqual(rdy.controller_id, 52496)
+        self.assertTrue(rdy.load())
+        self.assertEqual(mock.call_count, 2)
+
+        with self.assertRaises(AttributeError):
+            rdy.blech
+
+    @requests_mock.Mocker()
+    def test_lazy_failed_fetch(self, mock):
+        """ Test that a failed lazy fetch leaves the default attributes. """
+        from hydrawiser.core import Hydrawiser
+
+        mock.get(STATUS_SCHEDULE, text=load_fixture('errormessage.json'))
+        mock.get(CUSTOMER_DETAILS, text=load_fixture('errormessage.json'))
+
+        rdy = Hydrawiser(GOOD_API_KEY, lazy=True)
+        self.assertEqual(rdy.relays, [])
+        self.assertIsNone(rdy.num_relays)
+        self.assertFalse(rdy.load())
+        self.assertFalse(rdy.loaded)
+
+        # Once the server answers, the next read loads the object.
+        mock.get(STATUS_SCHEDULE, text=load_fixture('statusschedule.json'))
+        mock.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+        self.assertEqual(rdy.num_relays, 6)
+        self.assertTrue(rdy.loaded)
+
+    @requests_mock.Mocker()
+    def test_failed_fetch_retry(self, mock):
+        """ Test that load() retries a failed fetch. """
+        from hydrawiser.core import Hydrawiser
+
+        mock.get(STATUS_SCHEDULE, status_code=500)
+        mock.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+
+        rdy = Hydrawiser(GOOD_API_KEY)
+        self.assertFalse(rdy.loaded)
+        self.assertIsNone(rdy.num_relays)
+
+        mock.get(STATUS_SCHEDULE, text=load_fixture('statusschedule.json'))
+        self.assertTrue(rdy.load())
+        self.assertEqual(rdy.num_relays, 6)
+        self.assertEqual(mock.call_count, 4)
+        self.assertTrue(rdy.load())
+        self.assertEqual(mock.call_count, 4)
+
+    @requests_mock.Mocker()
+    def test_zone_table(self, mock):
+        """ Test the state of every zone is returned from one refresh. """
+
+        mock.get(STATUS_SCHEDULE, text=load_fixture('iswatering.json'))
+        mock.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+
+        table = self.rdy.zone_table()
+        self.assertEqual(mock.call_count, 2)
+
+        self.assertEqual(table['zone'], list(range(6)))
+        self.assertEqual(table['running'],
+                         [False, False, True, False, False, False])
+        self.assertEqual(table['time_remaining'], [0, 0, 297, 0, 0, 0])
+        self.assertEqual(table['relay'][2], 3)
+        self.assertEqual(table['name'][2], 'Backyard')
+        self.assertEqual(table['next_run'][2], 157680000)
+        self.assertEqual(table['suspended'][2], 1525233599)
+        self.assertEqual(table['last_watered'][2], '21 seconds ago')
+
+        self.assertEqual(self.rdy.running_zones(refresh=False), set([2]))
+        self.assertEqual(mock.call_count, 2)
+
+    @requests_mock.Mocker()
+    def test_multiple_running(self, mock):
+        """ Test that every running zone is reported. """
+        import json
+
+        status = json.loads(load_fixture('iswatering.json'))
+        status['running'].append({'relay': '5', 'relay_id': '428651',
+                                  'time_left': 120, 'run': '2 minutes'})
+
+        mock.get(STATUS_SCHEDULE, text=json.dumps(status))
+        mock.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+
+        # Relays 3 and 5 are the third and fifth zones.
+        self.assertEqual(self.rdy.running_zones(), set([2, 4]))
+        self.assertEqual(self.rdy.running_relays(), set([3, 5]))
+        self.assertEqual(self.rdy.list_running_zones(), 3)
+        self.assertTrue(self.rdy.is_zone_running(5))
+        self.assertEqual(self.rdy.time_remaining(5), 120)
+        self.assertEqual(self.rdy.time_remaining(3), 297)
+
+    @requests_mock.Mocker()
+    def test_unchanged_poll(self, mock):
+        """ Test that unchanged responses skip the update. """
+
+        mock.get(STATUS_SCHEDULE, text=load_fixture('statusschedule.json'))
+        mock.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+
+        relays = self.rdy.relays
+        self.assertTrue(self.rdy.update_controller_info())
+        self.assertIs(self.rdy.relays, relays)
+        self.assertEqual(self.rdy.poll_stats(),
+                         {'polls': 2, 'skipped': 1,
+                          'responses': 4, 'unchanged': 2})
+
+        mock.get(STATUS_SCHEDULE, text=load_fixture('iswatering.json'))
+        self.assertTrue(self.rdy.update_controller_info())
+        self.assertIsNot(self.rdy.relays, relays)
+        self.assertEqual(self.rdy.running[0]['time_left'], 297)
+        self.assertEqual(self.rdy.poll_stats()['skipped'], 1)
+
+        # A failed update is never skipped over.
+        mock.get(STATUS_SCHEDULE, text=load_fixture('errormessage.json'))
+        self.assertFalse(self.rdy.update_controller_info())
+        mock.get(STATUS_SCHEDULE, text=load_fixture('iswatering.json'))
+        self.assertTrue(self.rdy.update_controller_info())
+        self.assertEqual(self.rdy.num_relays, 6)
+        self.assertEqual(self.rdy.poll_stats()['skipped'], 1)
+
+    @requests_mock.Mocker()
+    def test_partial_failed_poll(self, mock):
+        """ Test that data from a failed update is applied later. """
+        import json
+        import requests
+
+        details = json.loads(load_fixture('customerdetails.json'))
+        details['controllers'][0]['name'] = 'Renamed'
+
+        mock.get(CUSTOMER_DETAILS, text=json.dumps(details))
+        mock.get(STATUS_SCHEDULE, exc=requests.exceptions.ConnectionError)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.rdy.update_controller_info()
+        self.assertEqual(self.rdy.name, 'Home Controller')
+
+        mock.get(STATUS_SCHEDULE, text=load_fixture('statusschedule.json'))
+        self.assertTrue(self.rdy.update_controller_info())
+        self.assertEqual(self.rdy.name, 'Renamed')
+        self.assertTrue(self.rdy.update_controller_info())
+        self.assertEqual(self.rdy.poll_stats()['skipped'], 1)
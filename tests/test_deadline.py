@@ -0,0 +1,141 @@
+import time
+import pytest
+from tests.const import API_URL
+from tests.extras import load_fixture
+
+
+def slow_transport(delay, status='iswatering.json'):
+    """ Replay the fixtures with every response taking delay seconds. """
+    from hydrawiser.replay import ReplayTransport
+
+    return ReplayTransport([
+        {'t': 0, 'd': delay, 's': 200,
+         'u': API_URL + '/customerdetails.php?api_key=key-0',
+         'b': load_fixture('customerdetails.json')},
+        {'t': 0, 'd': delay, 's': 200,
+         'u': API_URL + '/statusschedule.php?api_key=key-0',
+         'b': load_fixture(status)},
+        {'t': 0, 'd': delay, 's': 200,
+         'u': API_URL + '/setzone.php?api_key=key-0&action=run',
+         'b': load_fixture('setzone.json')}])
+
+
+def test_deadline():
+    from hydrawiser.helpers import Deadline, DeadlineExceeded
+
+    deadline = Deadline(0.05)
+    assert Deadline.coerce(deadline) is deadline
+    assert Deadline.coerce(None) is None
+    assert Deadline.coerce(1).budget == 1
+    assert 0 < deadline.timeout() <= 0.05
+
+    time.sleep(0.06)
+    assert deadline.remaining() == 0
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout()
+
+
+def test_time_remaining_budget():
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.helpers import DeadlineExceeded
+
+    with slow_transport(0.05) as transport:
+        rdy = Hydrawiser('key-0')
+
+        # Two requests are needed, only one fits in the budget.
+        start = time.time()
+        with pytest.raises(DeadlineExceeded):
+            rdy.time_remaining(3, deadline=0.07)
+        assert time.time() - start < 0.15
+
+        # The controller is only refreshed once, so both fit.
+        assert rdy.time_remaining(3, deadline=0.14) == 297
+        assert transport.requests == 6
+
+        # A slow request is cut off at the deadline.
+        with pytest.raises(DeadlineExceeded):
+            rdy.run_zone(5, 2, deadline=0.02)
+        assert rdy.run_zone(5, 2, deadline=1) is not None
+
+
+def test_stale_fallback():
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.helpers import DeadlineExceeded
+
+    with slow_transport(0.05):
+        # Nothing to fall back on yet.
+        with pytest.raises(DeadlineExceeded):
+            Hydrawiser('key-0', deadline=0.01, stale_ok=True)
+
+        rdy = Hydrawiser('key-0', lazy=True, stale_ok=True)
+        with pytest.raises(DeadlineExceeded):
+            rdy.load(deadline=0.01)
+        assert rdy.load(deadline=1)
+
+        start = time.time()
+        assert rdy.update_controller_info(deadline=0.01) is False
+        assert rdy.time_remaining(3, deadline=0.01) == 297
+        assert rdy.is_zone_running(3, deadline=0.01)
+        assert rdy.zone_table(deadline=0.01)['running'][2]
+        assert time.time() - start < 0.2
+
+
+def test_wait_for_update():
+    import threading
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.helpers import DeadlineExceeded
+
+    with slow_transport(0.1):
+        for stale_ok in (False, True):
+            rdy = Hydrawiser('key-0', stale_ok=stale_ok)
+            thread = threading.Thread(target=rdy.update_controller_info)
+            thread.start()
+            time.sleep(0.02)
+
+            # Another thread holds the update for longer than the budget.
+            start = time.time()
+            if stale_ok:
+                assert rdy.update_controller_info(deadline=0.03) is False
+            else:
+                with pytest.raises(DeadlineExceeded):
+                    rdy.update_controller_info(deadline=0.03)
+            assert time.time() - start < 0.08
+
+            # Without a deadline the update waits its turn.
+            assert rdy.update_controller_info()
+            thread.join()
+
+
+def test_lazy_deadline():
+    import requests_mock
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.helpers import DeadlineExceeded
+    from tests.const import GOOD_API_KEY, STATUS_SCHEDULE, CUSTOMER_DETAILS
+
+    with slow_transport(0.05) as transport:
+        rdy = Hydrawiser('key-0', lazy=True)
+
+        # Loading a lazy object counts against the deadline of the call.
+        start = time.time()
+        with pytest.raises(DeadlineExceeded):
+            rdy.suspend_zone(1, 0, deadline=0.07)
+        assert time.time() - start < 0.15
+        assert transport.requests == 2
+
+        with pytest.raises(DeadlineExceeded):
+            rdy.relay_info(0, deadline=0.07)
+        assert rdy.relay_info(0, 'relay', deadline=1) == 1
+        assert transport.requests == 6
+
+    with requests_mock.Mocker() as m:
+        m.get(STATUS_SCHEDULE, status_code=503)
+        m.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+
+        # A failed refresh isn't sent again to load the object.
+        rdy = Hydrawiser(GOOD_API_KEY, lazy=True)
+        assert not rdy.is_zone_running(3, deadline=1)
+        assert m.call_count == 2
+        assert rdy.list_running_zones(deadline=1) is None
+        assert rdy.time_remaining(3, deadline=1) is None
+        assert rdy.running_zones(deadline=1) == set()
+        assert m.call_count == 8
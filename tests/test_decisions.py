@@ -0,0 +1,71 @@
+from tests.test_base import UnitTestBase
+import requests_mock
+from tests.const import STATUS_SCHEDULE, CUSTOMER_DETAILS
+from tests.extras import load_fixture
+
+
+class TestDecisions(UnitTestBase):
+
+    def test_parse_amount(self):
+        """ Test rainfall strings are converted to inches. """
+        from hydrawiser.decisions import parse_amount
+
+        self.assertEqual(parse_amount('0.1 in'), 0.1)
+        self.assertEqual(parse_amount('25.4 mm'), 1.0)
+        self.assertEqual(parse_amount('2'), 2.0)
+        self.assertIsNone(parse_amount(''))
+        self.assertIsNone(parse_amount(None))
+
+    def test_should_skip(self):
+        """ Test the reasons a zone is skipped. """
+        from hydrawiser.decisions import SkipAdvisor
+
+        advisor = SkipAdvisor(self.rdy)
+
+        # The rain sensor is active and rain is forecast.
+        self.assertEqual(advisor.reasons(0), ['sensor', 'forecast'])
+        self.assertTrue(advisor.should_skip(0))
+        self.assertEqual(advisor.sensor_names(0), ['Rain'])
+
+        # Suspended until 1524675721.
+        self.assertEqual(advisor.reasons(0, now=1524675720),
+                         ['sensor', 'forecast', 'suspended'])
+
+        self.assertIsNone(advisor.should_skip(-1))
+        self.assertIsNone(advisor.should_skip(6))
+        self.assertIsNone(advisor.sensor_names(6))
+
+        advisor = SkipAdvisor(self.rdy, rain_probability=95)
+        self.assertEqual(advisor.reasons(0), ['sensor'])
+
+    @requests_mock.Mocker()
+    def test_snapshot_cache(self, mock):
+        """ Test the status is only parsed again when it changes. """
+        from hydrawiser.decisions import SkipAdvisor
+
+        advisor = SkipAdvisor(self.rdy)
+        snapshot = advisor._current()[0]
+        advisor.should_skip(1)
+        self.assertIs(advisor._current()[0], snapshot)
+
+        mock.get(STATUS_SCHEDULE, text=load_fixture('iswatering.json'))
+        mock.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+        self.rdy.update_controller_info()
+
+        self.assertIsNot(advisor._current()[0], snapshot)
+        self.assertEqual(advisor.reasons(0, now=0), ['suspended'])
+        self.assertFalse(advisor.should_skip(0))
+
+    def test_evaluate_fleet(self):
+        """ Test evaluating all zones of several controllers. """
+        from hydrawiser.decisions import SkipAdvisor, evaluate_fleet
+
+        advisors = [SkipAdvisor(self.rdy),
+                    SkipAdvisor(self.rdy, rain_probability=95)]
+        result = evaluate_fleet(advisors)
+
+        self.assertEqual(len(result['skip']), 12)
+        self.assertEqual(result['controller_id'], [52496] * 12)
+        self.assertEqual(result['zone'], list(range(6)) * 2)
+        self.assertEqual(result['forecast'], [True] * 6 + [False] * 6)
+        self.assertEqual(result['skip'], [True] * 12)
@@ -0,0 +1,148 @@
+import pytest
+import requests_mock
+from tests.const import (GOOD_API_KEY, STATUS_SCHEDULE, CUSTOMER_DETAILS,
+                         API_URL)
+from tests.extras import load_fixture
+
+
+def test_prefetch():
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.fleet import prefetch
+
+    with requests_mock.Mocker() as m:
+        m.get(STATUS_SCHEDULE, text=load_fixture('statusschedule.json'))
+        m.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+
+        fleet = [Hydrawiser(GOOD_API_KEY, lazy=True) for _ in range(20)]
+        assert m.call_count == 0
+
+        assert prefetch(fleet, max_workers=4) == [True] * 20
+        assert m.call_count == 40
+        assert all(rdy.num_relays == 6 for rdy in fleet)
+
+        # Loaded objects aren't fetched again.
+        assert prefetch(fleet) == [True] * 20
+        assert m.call_count == 40
+
+        # Objects whose fetch failed are.
+        m.get(STATUS_SCHEDULE, status_code=503)
+        failed = Hydrawiser(GOOD_API_KEY, lazy=True)
+        assert prefetch([failed]) == [False]
+        m.get(STATUS_SCHEDULE, text=load_fixture('statusschedule.json'))
+        assert prefetch(fleet + [failed]) == [True] * 21
+        assert failed.num_relays == 6
+        assert m.call_count == 44
+
+    assert prefetch([]) == []
+
+
+def test_bulk_suspend():
+    import json
+    import requests
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.fleet import (bulk_suspend, bulk_run, failed_accounts,
+                                  account_key)
+
+    tokens = ['0000-0000-0000-{:04d}'.format(i) for i in range(10)]
+
+    with requests_mock.Mocker() as m:
+        m.get(API_URL + '/statusschedule.php',
+              text=load_fixture('statusschedule.json'))
+        m.get(API_URL + '/customerdetails.php',
+              text=load_fixture('customerdetails.json'))
+        m.get(API_URL + '/setzone.php',
+              text=load_fixture('setzone.json'))
+
+        # The first account times out once, the second one always does.
+        m.get(API_URL + '/setzone.php?api_key=' + tokens[0],
+              [{'exc': requests.exceptions.ConnectTimeout},
+               {'text': load_fixture('setzone.json')}])
+        m.get(API_URL + '/setzone.php?api_key=' + tokens[1],
+              exc=requests.exceptions.ConnectTimeout)
+
+        fleet = [Hydrawiser(token, lazy=True) for token in tokens]
+        calls = []
+
+        manifest = bulk_suspend(fleet, 2, max_workers=4, retries=2,
+                                backoff=0, progress=lambda *a: calls.append(a))
+
+        assert len(calls) == 10
+        assert calls[-1][:2] == (10, 10)
+
+        results = manifest['results']
+        assert results[account_key(fleet[0])]['state'] == 'done'
+        assert results[account_key(fleet[0])]['attempts'] == 2
+        assert results[account_key(fleet[1])]['state'] == 'failed'
+        assert results[account_key(fleet[1])]['attempts'] == 3
+        # Commands on all zones don't fetch the controller information.
+        assert results[account_key(fleet[2])]['controller_id'] is None
+        assert m.call_count == 13
+        assert failed_accounts(manifest) == [account_key(fleet[1])]
+
+        # Re-running the saved manifest only retries the failed account.
+        manifest = json.loads(json.dumps(manifest))
+        m.get(API_URL + '/setzone.php?api_key=' + tokens[1],
+              text=load_fixture('setzone.json'))
+        calls = []
+        manifest = bulk_suspend(fleet, 2, backoff=0, manifest=manifest,
+                                progress=lambda *a: calls.append(a))
+        assert len(calls) == 1
+        assert failed_accounts(manifest) == []
+
+        # The manifest can't be reused for another command.
+        with pytest.raises(ValueError):
+            bulk_suspend(fleet, 3, manifest=manifest)
+
+        manifest = bulk_run(fleet[:2], 5, zone=6, backoff=0)
+        assert [r['state'] for r in manifest['results'].values()] == \
+            ['invalid', 'invalid']
+
+
+def test_bulk_failed_refresh():
+    import requests
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.fleet import bulk_suspend, account_key
+
+    tokens = ['0000-0000-0000-{:04d}'.format(i) for i in range(3)]
+
+    with requests_mock.Mocker() as m:
+        m.get(API_URL + '/statusschedule.php',
+              text=load_fixture('statusschedule.json'))
+        m.get(API_URL + '/customerdetails.php',
+              text=load_fixture('customerdetails.json'))
+        m.get(API_URL + '/setzone.php',
+              text=load_fixture('setzone.json'))
+
+        # The first account can't be refreshed, the second one is refused.
+        m.get(API_URL + '/statusschedule.php?api_key=' + tokens[0],
+              exc=requests.exceptions.ConnectTimeout)
+        m.get(API_URL + '/setzone.php?api_key=' + tokens[1],
+              text=load_fixture('errormessage.json'))
+
+        fleet = [Hydrawiser(token, lazy=True) for token in tokens]
+        manifest = bulk_suspend(fleet, 2, zone=0, retries=2, backoff=0)
+
+    results = [manifest['results'][account_key(hw)] for hw in fleet]
+    assert [r['state'] for r in results] == ['failed', 'failed', 'done']
+    assert results[0]['attempts'] == 3
+    assert results[0]['controller_id'] is None
+    assert results[1]['attempts'] == 1
+    assert results[1]['message'] == 'unauthorised'
+    assert results[2]['controller_id'] == 52496
+
+
+def test_zone_tables():
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.fleet import zone_tables
+
+    with requests_mock.Mocker() as m:
+        m.get(STATUS_SCHEDULE, text=load_fixture('iswatering.json'))
+        m.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+
+        fleet = [Hydrawiser(GOOD_API_KEY, lazy=True) for _ in range(3)]
+        table = zone_tables(fleet)
+
+    assert table['controller_id'] == [52496] * 18
+    assert table['zone'] == list(range(6)) * 3
+    assert sum(table['running']) == 3
+    assert zone_tables([])['zone'] == []
@@ -6,7 +6,7 @@ good_string = '{"controller_id":11111,"customer_id":22222}'
 
 
 def test_status_schedule():
-    from hydrawiser.helpers import status_schedule
+    from hydrawiser.helpers import status_schedule, last_error
     with requests_mock.Mocker() as m:
 
         # Test a valid api_key.
@@ -26,6 +26,17 @@ def test_status_schedule():
 
         return_value = status_schedule(BAD_API_KEY)
         assert return_value is None
+        assert last_error() == 'unauthorized'
+
+        # A server failure has no error message.
+        m.get('https://app.hydrawise.com/api/v1/statusschedule.php?'
+              'api_key={}'
+              .format(BAD_API_KEY),
+              status_code=503)
+
+        return_value = status_schedule(BAD_API_KEY)
+        assert return_value is None
+        assert last_error() is None
 
 
 def test_customer_details():
@@ -148,3 +159,46 @@ def test_set_zones():
 
         return_value = set_zones(BAD_API_KEY, 'runall', time=60)
         assert return_value is None
+
+
+def test_payload_fingerprint():
+    from hydrawiser.helpers import payload_fingerprint
+
+    first = b'{"relays": [], "last_contact": "41 seconds ago"}'
+    second = b'{"relays": [], "last_contact": "1 second ago"}'
+    changed = b'{"relays": [1], "last_contact": "1 second ago"}'
+
+    assert payload_fingerprint(first) == payload_fingerprint(second)
+    assert payload_fingerprint(first) != payload_fingerprint(changed)
+    assert payload_fingerprint(first, volatile=()) != \
+        payload_fingerprint(second, volatile=())
+
+
+def test_payload_cache():
+    from hydrawiser.helpers import status_schedule, PayloadCache
+
+    cache = PayloadCache()
+    url = ('https://app.hydrawise.com/api/v1/statusschedule.php?'
+           'api_key={}'.format(GOOD_API_KEY))
+
+    with requests_mock.Mocker() as m:
+        m.get(url, [{'text': '{"relays": [], "last_contact": "1"}'},
+                    {'text': '{"relays": [], "last_contact": "2"}'},
+                    {'text': unauthorized_string},
+                    {'text': '{"relays": [], "last_contact": "3"}'}])
+
+        first = status_schedule(GOOD_API_KEY, cache=cache)
+        assert cache.changed
+        assert m.last_request.headers['Accept-Encoding'] == 'gzip, deflate'
+
+        # The same payload is returned without decoding.
+        assert status_schedule(GOOD_API_KEY, cache=cache) is first
+        assert not cache.changed
+
+        # Errors are never cached and reset the cache.
+        assert status_schedule(GOOD_API_KEY, cache=cache) is None
+        assert status_schedule(GOOD_API_KEY, cache=cache) is not first
+        assert cache.changed
+
+    assert cache.responses == 4
+    assert cache.unchanged == 1
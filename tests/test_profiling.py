@@ -0,0 +1,107 @@
+import os
+import tempfile
+import requests_mock
+from tests.const import (GOOD_API_KEY, STATUS_SCHEDULE, CUSTOMER_DETAILS,
+                         SET_ZONE)
+from tests.extras import load_fixture
+
+
+def mock_server(m):
+    m.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+    m.get(STATUS_SCHEDULE, text=load_fixture('iswatering.json'))
+    m.get(SET_ZONE, text=load_fixture('setzone.json'))
+
+
+def test_method_stats():
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.profiling import Profiler
+
+    with requests_mock.Mocker() as m:
+        mock_server(m)
+
+        with Profiler() as profiler:
+            rdy = Hydrawiser(GOOD_API_KEY)
+            assert rdy.time_remaining(3) == 297
+            assert rdy.is_zone_running(3)
+            rdy.relay_info(0)
+            rdy.run_zone(5, 1)
+
+    stats = profiler.stats()
+
+    remaining = stats['Hydrawiser.time_remaining']
+    assert remaining['calls'] == 1
+    assert remaining['requests'] == 2
+    assert remaining['bytes'] == (
+        len(load_fixture('customerdetails.json').encode('utf-8')) +
+        len(load_fixture('iswatering.json').encode('utf-8')))
+    assert remaining['wall'] >= remaining['network'] + remaining['decode']
+
+    assert stats['Hydrawiser.update_controller_info']['calls'] == 3
+    assert stats['Hydrawiser.is_zone_running']['requests_per_call'] == 2
+    assert stats['Hydrawiser.relay_info']['requests'] == 0
+    assert stats['helpers.set_zones']['requests'] == 1
+    assert stats['helpers.status_schedule']['calls'] == 3
+    assert m.call_count == 7
+
+
+def test_call_sites_and_folded():
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.profiling import Profiler
+
+    handle, path = tempfile.mkstemp(suffix='.folded')
+    os.close(handle)
+    try:
+        with requests_mock.Mocker() as m:
+            mock_server(m)
+
+            with Profiler() as profiler:
+                rdy = Hydrawiser(GOOD_API_KEY)
+                for zone in range(3):
+                    rdy.is_zone_running(zone)
+
+        sites = profiler.site_stats()
+        polls = [values for (site, name), values in sites.items()
+                 if name == 'Hydrawiser.is_zone_running']
+        assert len(polls) == 1
+        assert polls[0]['calls'] == 3
+        assert polls[0]['requests'] == 6
+
+        # Only the calls made from here are call sites.
+        assert all(site.startswith('test_profiling.py:')
+                   for site, name in sites)
+        assert not any(name == 'Hydrawiser.update_controller_info'
+                       for site, name in sites)
+
+        profiler.dump_folded(path)
+        with open(path) as fdp:
+            lines = fdp.read().splitlines()
+        assert any(line.rsplit(' ', 1)[0].endswith(
+            ';Hydrawiser.is_zone_running;Hydrawiser.update_controller_info;'
+            'helpers.status_schedule;network') for line in lines)
+        assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+        report = profiler.report()
+        assert 'Hydrawiser.is_zone_running' in report
+        assert 'call site' in report
+    finally:
+        os.remove(path)
+
+
+def test_stop_restores():
+    from hydrawiser import core, helpers
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.profiling import Profiler
+
+    transport = helpers.get_transport()
+    method = Hydrawiser.__dict__['update_controller_info']
+    status = core.status_schedule
+
+    profiler = Profiler()
+    profiler.start()
+    assert core.status_schedule is not status
+    profiler.stop()
+
+    assert helpers.get_transport() is transport
+    assert Hydrawiser.__dict__['update_controller_info'] is method
+    assert core.status_schedule is status
+    assert helpers.status_schedule is status
@@ -0,0 +1,124 @@
+import os
+import tempfile
+import time
+import requests_mock
+from tests.const import (GOOD_API_KEY, STATUS_SCHEDULE, CUSTOMER_DETAILS,
+                         SET_ZONE, API_URL)
+from tests.extras import load_fixture
+
+
+def record_traffic(path):
+    """ Record a controller that goes from watering to done. """
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.replay import Recorder
+
+    with requests_mock.Mocker() as m:
+        m.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+        m.get(SET_ZONE, text=load_fixture('setzone.json'))
+        m.get(STATUS_SCHEDULE,
+              [{'text': load_fixture('statusschedule.json')},
+               {'text': load_fixture('iswatering.json')},
+               {'text': load_fixture('donewatering.json')}])
+
+        with Recorder(path) as recorder:
+            rdy = Hydrawiser(GOOD_API_KEY)
+            rdy.run_zone(5, 2)
+            rdy.update_controller_info()
+            rdy.update_controller_info()
+
+    return recorder
+
+
+def test_recorder_redacts_keys():
+    handle, path = tempfile.mkstemp(suffix='.jsonl.gz')
+    os.close(handle)
+    try:
+        recorder = record_traffic(path)
+        assert len(recorder.entries) == 7
+        assert all(GOOD_API_KEY not in e['u'] for e in recorder.entries)
+        assert all('api_key=key-0' in e['u'] for e in recorder.entries)
+    finally:
+        os.remove(path)
+
+
+def test_replay_transitions():
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.replay import ReplayTransport
+
+    handle, path = tempfile.mkstemp(suffix='.jsonl.gz')
+    os.close(handle)
+    try:
+        record_traffic(path)
+
+        with ReplayTransport.load(path, speed=0, loop=False) as transport:
+            rdy = Hydrawiser('key-0')
+            assert rdy.controller_id == 52496
+            assert rdy.run_zone(5, 2) is not None
+
+            rdy.update_controller_info()
+            assert rdy.running[0]['relay_id'] == '428642'
+
+            rdy.update_controller_info()
+            assert not rdy.running
+
+            # Without looping the last response is repeated.
+            rdy.update_controller_info()
+            assert not rdy.running
+
+            # Unknown accounts get an error response.
+            assert Hydrawiser('key-1').controller_id is None
+
+        assert transport.requests == 11
+    finally:
+        os.remove(path)
+
+
+def test_replay_fleet():
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.replay import ReplayTransport
+
+    entries = [
+        {'t': 0, 'd': 0.001,
+         'u': API_URL + '/customerdetails.php?'
+                        'api_key=key-0&type=controllers',
+         's': 200, 'b': load_fixture('customerdetails.json')},
+        {'t': 0, 'd': 0.001,
+         'u': API_URL + '/statusschedule.php?api_key=key-0',
+         's': 200, 'b': load_fixture('iswatering.json')},
+        {'t': 1, 'd': 0.001,
+         'u': API_URL + '/statusschedule.php?api_key=key-0',
+         's': 200, 'b': load_fixture('donewatering.json')}]
+
+    with ReplayTransport(entries, speed=100):
+        fleet = [Hydrawiser('key-0') for _ in range(4)]
+
+    # The recorded transitions are cycled through across the fleet.
+    running = [bool(rdy.running) for rdy in fleet]
+    assert running == [True, False, True, False]
+
+
+def test_replay_pace():
+    from hydrawiser.replay import ReplayTransport
+
+    url = API_URL + '/statusschedule.php?api_key=key-0'
+    entries = [{'t': t, 'd': 0, 'u': url, 's': 200, 'b': '{}'}
+               for t in (0, 1, 2)]
+
+    # Only response times are replayed by default.
+    transport = ReplayTransport(entries, speed=10)
+    start = time.time()
+    for _ in range(3):
+        transport(url)
+    assert time.time() - start < 0.1
+
+    # The recorded gaps of 1s are replayed ten times faster.
+    transport = ReplayTransport(entries, speed=10, pace=True)
+    start = time.time()
+    for _ in range(3):
+        transport(url)
+    assert 0.2 <= time.time() - start < 0.3
+
+    # The second pass of the loop starts where the first one ended.
+    transport(url)
+    transport(url)
+    assert 0.3 <= time.time() - start < 0.4
@@ -0,0 +1,87 @@
+import time
+import requests_mock
+from tests.const import (GOOD_API_KEY, STATUS_SCHEDULE, CUSTOMER_DETAILS,
+                         SET_ZONE)
+from tests.extras import load_fixture
+
+
+def setzone_requests(mock):
+    return [(request.qs['action'][0], request.qs.get('relay_id', [None])[0])
+            for request in mock.request_history
+            if request.path.endswith('setzone.php')]
+
+
+def test_program_order():
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.sequencer import Sequencer, Step, Soak
+
+    with requests_mock.Mocker() as m:
+        m.get(STATUS_SCHEDULE, text=load_fixture('donewatering.json'))
+        m.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+        m.get(SET_ZONE, text=load_fixture('setzone.json'))
+
+        fleet = [Hydrawiser(GOOD_API_KEY) for _ in range(3)]
+
+        with Sequencer(max_workers=2, time_scale=0.001) as sequencer:
+            programs = [sequencer.add(rdy, [Step(0, 1), Soak(1), Step(1, 2)],
+                                      repeat=2)
+                        for rdy in fleet]
+            assert sequencer.wait(timeout=10)
+
+            assert sequencer.pending() == 0
+            status = sequencer.status(programs[0])
+            assert status['done'] and status['step'] == status['steps'] == 6
+            assert status['errors'] == []
+
+        sent = setzone_requests(m)
+        assert len(sent) == 12
+        assert [relay for _, relay in sent[::3]] == \
+            ['428639', '428641', '428639', '428641']
+        assert all(action == 'run' for action, _ in sent)
+
+
+def test_resync_running_zone():
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.sequencer import Sequencer, Step
+
+    with requests_mock.Mocker() as m:
+        m.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+        m.get(SET_ZONE, text=load_fixture('setzone.json'))
+        m.get(STATUS_SCHEDULE, text=load_fixture('donewatering.json'))
+        rdy = Hydrawiser(GOOD_API_KEY)
+
+        # Zone 2 is still running with 297 seconds left when it should have
+        # finished, then it is done.
+        m.get(STATUS_SCHEDULE, [{'text': load_fixture('iswatering.json')},
+                                {'text': load_fixture('donewatering.json')}])
+
+        with Sequencer(time_scale=0.001) as sequencer:
+            start = time.time()
+            sequencer.add(rdy, [Step(2, 1), Step(0, 1)])
+            assert sequencer.wait(timeout=10)
+            elapsed = time.time() - start
+
+        # 60 + 297 + 60 seconds of program time.
+        assert elapsed >= 0.4
+        assert [relay for _, relay in setzone_requests(m)] == \
+            ['428642', '428639']
+
+
+def test_failed_and_cancelled():
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.sequencer import Sequencer, Step, Soak
+
+    with requests_mock.Mocker() as m:
+        m.get(STATUS_SCHEDULE, text=load_fixture('donewatering.json'))
+        m.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+        m.get(SET_ZONE, text=load_fixture('errormessage.json'))
+        rdy = Hydrawiser(GOOD_API_KEY)
+
+        with Sequencer(time_scale=0.001) as sequencer:
+            failed = sequencer.add(rdy, [Step(0, 1), Step(9, 1)])
+            cancelled = sequencer.add(rdy, [Soak(1000)])
+            sequencer.cancel(cancelled)
+            assert sequencer.wait(timeout=10)
+
+            assert sequencer.status(failed)['errors'] == [0, 1]
+            assert sequencer.status(cancelled)['cancelled']
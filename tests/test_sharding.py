@@ -0,0 +1,146 @@
+import time
+from tests.const import API_URL
+from tests.extras import load_fixture
+
+TOKENS = ['key-{}'.format(i) for i in range(8)]
+
+
+def replay_transport(tokens):
+    import json
+    from hydrawiser.replay import ReplayTransport
+
+    # An account without controllers can't be applied.
+    details = json.loads(load_fixture('customerdetails.json'))
+    details['controllers'] = []
+    entries = [{'t': 0, 'd': 0, 's': 200,
+                'u': API_URL + '/customerdetails.php?api_key=key-broken',
+                'b': json.dumps(details)},
+               {'t': 0, 'd': 0, 's': 200,
+                'u': API_URL + '/statusschedule.php?api_key=key-broken',
+                'b': load_fixture('iswatering.json')}]
+    for token in tokens:
+        entries.append({'t': 0, 'd': 0, 's': 200,
+                        'u': API_URL + '/customerdetails.php?api_key=' + token,
+                        'b': load_fixture('customerdetails.json')})
+        entries.append({'t': 0, 'd': 0, 's': 200,
+                        'u': API_URL + '/statusschedule.php?api_key=' + token,
+                        'b': load_fixture('iswatering.json')})
+    return ReplayTransport(entries, speed=0)
+
+
+class FlakyTransport():
+    """ Fails every request for the accounts named key-down. """
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def __call__(self, url, params=None, **kwargs):
+        import requests
+
+        if 'key-down' in url or (params or {}).get('api_key') == 'key-down':
+            raise requests.exceptions.ConnectionError('Connection refused.')
+        return self.transport(url, params=params, **kwargs)
+
+
+def wait_for(poller, tokens, timeout=10):
+    end = time.time() + timeout
+    while not set(tokens) <= set(poller.snapshots) and time.time() < end:
+        poller.poll(timeout=0.1)
+    return set(tokens) <= set(poller.snapshots)
+
+
+def test_shard_for():
+    from hydrawiser.sharding import shard_for
+
+    owners = [shard_for(token, 4) for token in TOKENS]
+    assert owners == [shard_for(token, 4) for token in TOKENS]
+    assert all(0 <= owner < 4 for owner in owners)
+
+    # Adding a shard only moves accounts onto the new shard.
+    for token, owner in zip(TOKENS, owners):
+        assert shard_for(token, 5) in (owner, 4)
+
+
+def test_sharded_poller():
+    from hydrawiser.core import Hydrawiser
+    from hydrawiser.sharding import ShardedPoller, shard_for
+
+    transport = replay_transport(TOKENS + ['key-new'])
+
+    with ShardedPoller(TOKENS[:6], processes=2, interval=60,
+                       transport=transport) as poller:
+        assert wait_for(poller, TOKENS[:6])
+
+        status = poller.snapshots['key-0']['controller_status']
+        assert status['running'][0]['time_left'] == 297
+        rdy = Hydrawiser.from_snapshot(poller.snapshots['key-1'], 'key-1')
+        assert rdy.controller_id == 52496
+        assert poller.owner('key-0') == shard_for('key-0', 2)
+
+        poller.add('key-new')
+        assert wait_for(poller, ['key-new'])
+
+        poller.remove('key-0')
+        assert 'key-0' not in poller.snapshots
+        assert poller.owner('key-0') is None
+
+        # Moved accounts are polled again by their new owner.
+        poller.snapshots.clear()
+        poller.resize(3)
+        moved = [token for token in TOKENS[1:6] + ['key-new']
+                 if shard_for(token, 3) == 2]
+        assert wait_for(poller, moved)
+        assert poller.processes == 3
+
+        poller.resize(1)
+        assert all(poller.owner(token) == 0 for token in TOKENS[1:6])
+
+        # Unreadable accounts report an empty snapshot.
+        poller.add('key-unknown')
+        assert wait_for(poller, ['key-unknown'])
+        assert poller.snapshots['key-unknown'] is None
+
+
+def test_worker_failures():
+    from hydrawiser import sharding
+    from hydrawiser.sharding import ShardedPoller
+
+    transport = FlakyTransport(replay_transport(TOKENS[:2]))
+    accounts = ['key-down', 'key-broken'] + TOKENS[:2]
+    backoff = sharding.RESTART_BACKOFF
+    sharding.RESTART_BACKOFF = 2.0
+
+    try:
+        with ShardedPoller(accounts, processes=1, interval=0.01,
+                           transport=transport) as poller:
+            # A failed request or a bad response doesn't stop the other
+            # accounts.
+            assert wait_for(poller, accounts)
+            assert poller.snapshots['key-down'] is None
+            assert poller.snapshots['key-broken'] is None
+            assert poller.snapshots['key-0'] is not None
+            assert poller.restarts == 0
+
+            # A worker that dies is restarted with its accounts, even if it
+            # was killed while sending a result.
+            process = poller._workers[0][0]
+            process.terminate()
+            process.join()
+            poller.snapshots.clear()
+            assert wait_for(poller, TOKENS[:2])
+            assert poller.restarts == 1
+            assert poller._workers[0][0].is_alive()
+
+            # One that dies again right away waits before its restart.
+            process = poller._workers[0][0]
+            process.terminate()
+            process.join()
+            poller.poll()
+            assert poller.restarts == 1
+            assert not poller._workers[0][0].is_alive()
+
+            poller.snapshots.clear()
+            assert wait_for(poller, TOKENS[:2])
+            assert poller.restarts == 2
+    finally:
+        sharding.RESTART_BACKOFF = backoff
@@ -0,0 +1,92 @@
+import pickle
+import pytest
+import requests_mock
+from tests.test_base import UnitTestBase
+from tests.const import GOOD_API_KEY, STATUS_SCHEDULE, CUSTOMER_DETAILS
+from tests.extras import load_fixture
+
+
+class TestSnapshot(UnitTestBase):
+
+    def check_copy(self, rdy):
+        """ Check that an object rebuilt from a snapshot is complete. """
+
+        self.assertEqual(rdy.controller_id, self.rdy.controller_id)
+        self.assertEqual(rdy.customer_id, self.rdy.customer_id)
+        self.assertEqual(rdy.name, self.rdy.name)
+        self.assertEqual(rdy.status, self.rdy.status)
+        self.assertEqual(rdy.num_relays, self.rdy.num_relays)
+        self.assertEqual(rdy.relays, self.rdy.relays)
+        self.assertEqual(rdy.sensors[0]['name'], 'Rain')
+        self.assertEqual(rdy.relay_info(0, 'name'), 'Right yard')
+        self.assertEqual(rdy.zone_table(refresh=False),
+                         self.rdy.zone_table(refresh=False))
+
+    def test_round_trip(self):
+        """ Test both formats rebuild the object without the network. """
+        from hydrawiser import snapshot
+
+        binary = snapshot.dumps(self.rdy)
+        text = snapshot.dumps(self.rdy, binary=False)
+
+        self.assertTrue(binary.startswith(b'HWS\x01M'))
+        self.assertTrue(text.startswith(b'HWS\x01J'))
+        self.assertLess(len(binary), len(load_fixture('statusschedule.json')))
+
+        with requests_mock.Mocker() as mock:
+            self.check_copy(snapshot.loads(binary))
+            self.check_copy(snapshot.loads(text, compact=True))
+            self.check_copy(snapshot.loads(text[5:]))
+            self.assertEqual(mock.call_count, 0)
+
+        rdy = snapshot.loads(binary, GOOD_API_KEY, compact=True)
+        self.assertIs(snapshot.dumps(rdy), snapshot.dumps(rdy))
+
+    def test_normal_snapshot(self):
+        """ Test that normal objects snapshot without sharing their data. """
+        from hydrawiser import storage
+
+        before = storage.shared_count()
+        state = self.rdy.snapshot()
+        self.assertEqual(storage.shared_count(), before)
+        self.assertNotIn('features', state['controller_info'])
+        self.assertEqual(state, self.rdy.__class__.from_snapshot(
+            state).snapshot())
+
+    def test_invalid(self):
+        """ Test that invalid data is rejected. """
+        from hydrawiser import snapshot
+        from hydrawiser.core import Hydrawiser
+
+        with pytest.raises(ValueError):
+            snapshot.decode(b'garbage')
+        with pytest.raises(ValueError):
+            snapshot.decode(b'HWS\x02M')
+        with pytest.raises(ValueError):
+            snapshot.decode(b'HWS\x01X')
+        with pytest.raises(ValueError):
+            Hydrawiser.from_snapshot({'version': 0})
+
+    @requests_mock.Mocker()
+    def test_commands(self, mock):
+        """ Test that a rebuilt object can refresh and send commands. """
+        from hydrawiser.core import Hydrawiser
+
+        mock.get(STATUS_SCHEDULE, text=load_fixture('iswatering.json'))
+        mock.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+
+        rdy = Hydrawiser.from_snapshot(self.rdy.snapshot(), GOOD_API_KEY)
+        self.assertTrue(rdy.loaded)
+        self.assertEqual(rdy.time_remaining(3), 297)
+
+    def test_pickle(self):
+        """ Test that objects pickle as their snapshot. """
+        from hydrawiser.core import Hydrawiser
+
+        with requests_mock.Mocker() as mock:
+            self.check_copy(pickle.loads(pickle.dumps(self.rdy)))
+
+            lazy = pickle.loads(pickle.dumps(
+                Hydrawiser(GOOD_API_KEY, lazy=True)))
+            self.assertFalse(lazy.loaded)
+            self.assertEqual(mock.call_count, 0)
@@ -0,0 +1,65 @@
+import requests_mock
+from tests.const import GOOD_API_KEY, STATUS_SCHEDULE, CUSTOMER_DETAILS
+from tests.extras import load_fixture
+
+
+def make_fleet(count, compact):
+    from hydrawiser.core import Hydrawiser
+
+    with requests_mock.Mocker() as m:
+        m.get(STATUS_SCHEDULE, text=load_fixture('statusschedule.json'))
+        m.get(CUSTOMER_DETAILS, text=load_fixture('customerdetails.json'))
+        return [Hydrawiser(GOOD_API_KEY, compact=compact)
+                for _ in range(count)]
+
+
+def test_compact_attributes():
+    rdy, other = make_fleet(2, True)
+
+    assert rdy.controller_id == 52496
+    assert rdy.customer_id == 47076
+    assert rdy.name == 'Home Controller'
+    assert rdy.status == 'All good!'
+    assert rdy.num_relays == 6
+    assert rdy.relay_info(0, 'name') == 'Right yard'
+    assert len(rdy.relay_info(0)) == 12
+    assert rdy.sensors[0]['relays'][0]['id'] == 428639
+    assert rdy.controller_status['forecast'][0]['pop'] == 90
+
+    # Unused data is dropped.
+    assert 'features' not in rdy.controller_info
+    assert 'icon' not in rdy.controller_status['forecast'][0]
+
+    # Equal data is shared between objects.
+    assert rdy.controller_info is other.controller_info
+    assert rdy.relays is other.relays
+
+
+def test_compact_memory():
+    import tracemalloc
+
+    tracemalloc.start()
+    fleet = make_fleet(50, False)
+    normal = tracemalloc.get_traced_memory()[0]
+    del fleet
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    fleet = make_fleet(50, True)
+    compact = tracemalloc.get_traced_memory()[0]
+    del fleet
+    tracemalloc.stop()
+
+    assert compact * 2 < normal
+
+
+def test_shared_released():
+    from hydrawiser.storage import compact_status, shared_count
+
+    status = compact_status({'relays': [{'name': 'unique relay 4242'}]})
+    count = shared_count()
+    assert status['relays'][0]['name'] == 'unique relay 4242'
+
+    del status
+    assert shared_count() < count
+    assert compact_status(None) is None
@@ -0,0 +1,257 @@
+"""
+Concurrency stress and soak tests against a local fake server.
+
+Each test runs for HYDRAWISER_SOAK_SECONDS seconds (default 2). Set it
+higher for a real soak run, and run pytest with -s to see the throughput and
+latency report.
+"""
+import json
+import os
+import threading
+import time
+import unittest
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # pragma: no cover
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from tests.extras import load_fixture
+
+SOAK_SECONDS = float(os.environ.get('HYDRAWISER_SOAK_SECONDS', '2'))
+
+WATERING = load_fixture('iswatering.json')
+
+# A smaller controller with nothing running, so a mix of the two payloads
+# shows up as a wrong number of relays or a wrong running zone.
+_IDLE = json.loads(load_fixture('donewatering.json'))
+_IDLE['relays'] = _IDLE['relays'][:4]
+IDLE = json.dumps(_IDLE)
+
+SETZONE = json.loads(load_fixture('setzone.json'))
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """ Answers like the Hydrawise server. """
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split('?')[0]
+
+        if path.endswith('/statusschedule.php'):
+            with server.lock:
+                server.status_requests += 1
+                body = WATERING if server.status_requests % 2 else IDLE
+        elif path.endswith('/customerdetails.php'):
+            body = server.details
+        elif path.endswith('/setzone.php'):
+            body = server.setzone
+        else:
+            self.send_error(404)
+            return
+
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeServer(ThreadingMixIn, HTTPServer):
+    """ Threaded fake Hydrawise server. """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), FakeHandler)
+        self.lock = threading.Lock()
+        self.status_requests = 0
+        self.details = load_fixture('customerdetails.json')
+        self.setzone = load_fixture('setzone.json')
+
+
+def percentile(values, pct):
+    """ Returns a percentile of a list of numbers. """
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+
+def check_last_zone(rdy):
+    """
+    Read and command the last zone. Each call reads the object once, so the
+    zone may be gone by then but a call must never mix two refreshes.
+    """
+    last = len(rdy.relays) - 1
+
+    assert rdy.relay_info(last, 'relay_id') in (428653, 428643, None)
+    assert rdy.time_remaining(last) in (0, 297, None)
+    assert rdy.run_zone(1, last) in (SETZONE, None)
+    assert rdy.suspend_zone(0, last) in (SETZONE, None)
+
+
+def hammer(targets, seconds):
+    """
+    Call every target repeatedly from its own thread for some seconds.
+
+    :returns: (calls, latencies, errors)
+    """
+    end = time.time() + seconds
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+
+    def loop(target):
+        local = []
+        while time.time() < end:
+            start = time.time()
+            try:
+                target()
+            except Exception as error:  # pylint: disable=broad-except
+                with lock:
+                    errors.append(repr(error))
+            local.append(time.time() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=loop, args=(target,))
+               for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return len(latencies), latencies, errors
+
+
+def check_consistent(rdy):
+    """ Raise if the object shows a mix of two refreshes. """
+    # snapshot() and zone_table() each answer from a single refresh.
+    status = rdy.snapshot()['controller_status']
+    running = [entry['relay_id'] for entry in status.get('running') or []]
+
+    if len(status['relays']) == 6:
+        assert running == ['428642'], status
+    else:
+        assert len(status['relays']) == 4, status
+        assert running == [], status
+
+    table = rdy.zone_table(refresh=False)
+    running = [zone for zone, on in zip(table['zone'], table['running'])
+               if on]
+
+    if len(table['zone']) == 6:
+        assert running == [2], table
+        assert table['time_remaining'][2] == 297, table
+    else:
+        assert len(table['zone']) == 4, table
+        assert running == [], table
+
+
+class TestStress(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        from hydrawiser import helpers
+
+        cls.server = FakeServer()
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+        cls.api_url = helpers.API_URL
+        helpers.API_URL = 'http://127.0.0.1:{}/api/v1'.format(
+            cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        from hydrawiser import helpers
+
+        helpers.API_URL = cls.api_url
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_shared_instance(self):
+        """ Hammer one object from many threads and look for torn state. """
+        from hydrawiser.core import Hydrawiser
+
+        for compact in (False, True):
+            rdy = Hydrawiser('stress', compact=compact)
+
+            targets = [rdy.update_controller_info] * 4 + \
+                [lambda: rdy.run_zone(1, 0)] * 2 + \
+                [lambda: check_consistent(rdy)] * 4 + \
+                [lambda: check_last_zone(rdy)] * 2 + \
+                [lambda: rdy.is_zone_running(3),
+                 lambda: rdy.time_remaining(3),
+                 lambda: rdy.running_zones()]
+
+            calls, _, errors = hammer(targets, SOAK_SECONDS / 2)
+
+            self.assertEqual(errors, [])
+            self.assertGreater(calls, 0)
+            self.assertIn(rdy.num_relays, (4, 6))
+            self.assertEqual(rdy.num_relays, len(rdy.relays))
+
+    def test_scaling(self):
+        """ Measure throughput and latency as concurrency grows. """
+        from hydrawiser.core import Hydrawiser
+
+        levels = (1, 4, 16)
+        report = []
+
+        for workers in levels:
+            fleet = [Hydrawiser('stress-{}'.format(i), lazy=True)
+                     for i in range(workers)]
+            targets = [rdy.update_controller_info for rdy in fleet]
+
+            calls, latencies, errors = hammer(targets,
+                                              SOAK_SECONDS / len(levels))
+
+            self.assertEqual(errors, [])
+            self.assertEqual(len(latencies), calls)
+            # Every thread got through at least one update.
+            self.assertGreaterEqual(calls, workers)
+            report.append((workers, calls / (SOAK_SECONDS / len(levels)),
+                           percentile(latencies, 50),
+                           percentile(latencies, 95),
+                           percentile(latencies, 99)))
+
+        print('\nworkers   updates/s    p50 ms    p95 ms    p99 ms')
+        for workers, rate, p50, p95, p99 in report:
+            print('{:7} {:11.1f} {:9.2f} {:9.2f} {:9.2f}'.format(
+                workers, rate, p50 * 1000, p95 * 1000, p99 * 1000))
+
+    def test_memory_growth(self):
+        """ Memory doesn't grow while polling the same objects. """
+        import pytest
+        from hydrawiser.core import Hydrawiser
+
+        tracemalloc = pytest.importorskip('tracemalloc')
+
+        fleet = [Hydrawiser('soak-{}'.format(i), compact=i % 2 == 0)
+                 for i in range(8)]
+        targets = [rdy.update_controller_info for rdy in fleet] + \
+            [lambda rdy=rdy: rdy.zone_table(refresh=False) for rdy in fleet]
+
+        # Warm up so that caches and connection pools are populated.
+        hammer(targets, SOAK_SECONDS / 4)
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            hammer(targets, SOAK_SECONDS / 2)
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        print('\nmemory growth: {:,} bytes'.format(after - before))
+        self.assertLess(after - before, 256 * 1024)